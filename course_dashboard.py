@@ -7,6 +7,7 @@ Access grades, lecture notes, and PDF summaries for any course
 import sys
 import os
 import json
+import re
 import requests
 import shutil
 from pathlib import Path
@@ -14,7 +15,7 @@ from datetime import datetime
 from typing import Dict, Any, List, Optional, Tuple, Union
 
 from moodle_client import MoodleAPIClient
-from pdf_summarizer import PDFSummarizer
+from pdf_summarizer import PDFSummarizer, hash_file
 from grade_analyzer import GradeAnalyzer
 import config
 
@@ -211,6 +212,10 @@ def display_grades(grades, course_name):
             print(f"  Grade: {grade}")
             print()
 
+# Module types and name keywords that indicate lecture notes
+_LECTURE_TYPES = frozenset({'resource', 'url', 'folder'})
+_LECTURE_RE = re.compile(r'lecture|notes|slides|presentation|chapter|week|topic|class', re.IGNORECASE)
+
 def is_likely_lecture_note(module):
     """
     Check if a module is likely to be a lecture note
@@ -221,29 +226,9 @@ def is_likely_lecture_note(module):
     Returns:
         True if the module is likely a lecture note, False otherwise
     """
-    # Check module type
-    module_type = module.get('modname', '').lower()
-    
-    # Check module name
-    name = module.get('name', '').lower()
-    
-    # Keywords that might indicate lecture notes
-    lecture_keywords = ['lecture', 'notes', 'slides', 'presentation', 'chapter', 'week', 'topic', 'class']
-    
-    # Check if it's a resource (file) or a URL
-    if module_type in ['resource', 'url']:
-        # Check if the name contains lecture keywords
-        for keyword in lecture_keywords:
-            if keyword in name:
-                return True
-    
-    # If it's a folder, check if it might contain lecture notes
-    if module_type == 'folder':
-        for keyword in lecture_keywords:
-            if keyword in name:
-                return True
-    
-    return False
+    # Resources (files), URLs and folders whose name contains a lecture keyword
+    return (module.get('modname', '').lower() in _LECTURE_TYPES
+            and _LECTURE_RE.search(module.get('name', '')) is not None)
 
 def get_lecture_notes(client, course_id):
     """
@@ -270,9 +255,9 @@ def get_lecture_notes(client, course_id):
         for module in section.get('modules', []):
             # Check if this module is likely a lecture note
             if is_likely_lecture_note(module):
-                # Add section name to the module for context
-                module['section_name'] = section_name
-                lecture_notes.append(module)
+                # Add section name to a copy of the module for context; the
+                # client may return the same parsed contents to later calls
+                lecture_notes.append({**module, 'section_name': section_name})
     
     return lecture_notes
 
@@ -372,8 +357,13 @@ def display_lecture_notes(lecture_notes, course_shortname=None, download=False,
         download_dir.mkdir(parents=True, exist_ok=True)
         print(f"\nDownloading files to {download_dir}")
         
-        # Initialize PDF summarizer if summarization is requested
+        # Results of each download, returned at the end
+        download_results = []
+        
+        # Initialize PDF summarizer if summarization is requested; summaries
+        # are collected and stored in one transaction at the end
         pdf_summarizer = None
+        pending_summaries = []
         if summarize:
             try:
                 pdf_summarizer = PDFSummarizer(api_key=config.OPENAI_API_KEY)
@@ -441,11 +431,22 @@ def display_lecture_notes(lecture_notes, course_shortname=None, download=False,
                             if summarize and pdf_summarizer and file_path.suffix.lower() == '.pdf':
                                 try:
                                     print(f"       ⟳ Generating summary for {file_path.name}...")
+                                    digest = hash_file(str(file_path))
                                     summary = pdf_summarizer.summarize_pdf(
                                         str(file_path),
                                         module.get('course', 0),
-                                        module.get('id', 0)
+                                        module.get('id', 0),
+                                        store=False,
+                                        sha256=digest
                                     )
+                                    pending_summaries.append((
+                                        module.get('course', 0),
+                                        module.get('id', 0),
+                                        file_path.name,
+                                        str(file_path),
+                                        summary,
+                                        digest
+                                    ))
                                     download_results[-1]['summary'] = summary
                                     print(f"       ✓ Summary generated successfully")
                                 except Exception as e:
@@ -488,6 +489,12 @@ def display_lecture_notes(lecture_notes, course_shortname=None, download=False,
                         })
     
     if download:
+        if pdf_summarizer and pending_summaries:
+            try:
+                pdf_summarizer.store_summaries(pending_summaries)
+            except Exception as e:
+                print(f"\nError saving summaries: {e}")
+        
         # Summary of download results
         successful = sum(1 for result in download_results if result['success'])
         print(f"\nDownload summary: {successful}/{len(download_results)} files downloaded successfully")
@@ -25,10 +25,18 @@ def find_course_by_name(client, course_name):
         Course dict if found, None otherwise
     """
     courses = client.get_courses()
+    needle = course_name.lower()
     
     # Try to find an exact match first
+    by_shortname = {course['shortname'].lower(): course for course in courses}
+    by_fullname = {course['fullname'].lower(): course for course in courses}
+    course = by_shortname.get(needle) or by_fullname.get(needle)
+    if course:
+        return course
+    
+    # Fall back to a substring match
     for course in courses:
-        if course_name.lower() in course['fullname'].lower() or course_name.lower() in course['shortname'].lower():
+        if needle in course['fullname'].lower() or needle in course['shortname'].lower():
             return course
     
     return None
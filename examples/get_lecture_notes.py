@@ -6,6 +6,7 @@ Extract and display lecture notes for a specific course
 import sys
 import os
 import json
+import re
 from datetime import datetime
 from typing import Dict, Any, List, Optional
 
@@ -25,14 +26,26 @@ def find_course_by_name(client, course_name):
         Course dict if found, None otherwise
     """
     courses = client.get_courses()
+    needle = course_name.lower()
     
     # Try to find an exact match first
+    by_shortname = {course['shortname'].lower(): course for course in courses}
+    by_fullname = {course['fullname'].lower(): course for course in courses}
+    course = by_shortname.get(needle) or by_fullname.get(needle)
+    if course:
+        return course
+    
+    # Fall back to a substring match
     for course in courses:
-        if course_name.lower() in course['fullname'].lower() or course_name.lower() in course['shortname'].lower():
+        if needle in course['fullname'].lower() or needle in course['shortname'].lower():
             return course
     
     return None
 
+# Module types and name keywords that indicate lecture notes
+_LECTURE_TYPES = frozenset({'resource', 'url', 'folder'})
+_LECTURE_RE = re.compile(r'lecture|notes|slides|presentation|chapter|week|topic|class', re.IGNORECASE)
+
 def is_likely_lecture_note(module):
     """
     Check if a module is likely to be a lecture note
@@ -43,29 +56,9 @@ def is_likely_lecture_note(module):
     Returns:
         True if the module is likely a lecture note, False otherwise
     """
-    # Check module type
-    module_type = module.get('modname', '').lower()
-    
-    # Check module name
-    name = module.get('name', '').lower()
-    
-    # Keywords that might indicate lecture notes
-    lecture_keywords = ['lecture', 'notes', 'slides', 'presentation', 'chapter', 'week', 'topic', 'class']
-    
-    # Check if it's a resource (file) or a URL
-    if module_type in ['resource', 'url']:
-        # Check if the name contains lecture keywords
-        for keyword in lecture_keywords:
-            if keyword in name:
-                return True
-    
-    # If it's a folder, check if it might contain lecture notes
-    if module_type == 'folder':
-        for keyword in lecture_keywords:
-            if keyword in name:
-                return True
-    
-    return False
+    # Resources (files), URLs and folders whose name contains a lecture keyword
+    return (module.get('modname', '').lower() in _LECTURE_TYPES
+            and _LECTURE_RE.search(module.get('name', '')) is not None)
 
 def get_lecture_notes(client, course_id):
     """
@@ -92,9 +85,9 @@ def get_lecture_notes(client, course_id):
         for module in section.get('modules', []):
             # Check if this module is likely a lecture note
             if is_likely_lecture_note(module):
-                # Add section name to the module for context
-                module['section_name'] = section_name
-                lecture_notes.append(module)
+                # Add section name to a copy of the module for context; the
+                # client may return the same parsed contents to later calls
+                lecture_notes.append({**module, 'section_name': section_name})
     
     return lecture_notes
 
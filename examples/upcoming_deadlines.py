@@ -7,6 +7,7 @@ import sys
 import os
 import json
 from datetime import datetime, timedelta
+from operator import itemgetter
 
 # Add the parent directory to the path so we can import the client
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -63,17 +64,18 @@ def get_upcoming_assignments(client, days_ahead=14):
                         })
     
     # Sort by due date (earliest first)
-    upcoming.sort(key=lambda x: x['due_date'])
+    upcoming.sort(key=itemgetter('due_date'))
     
     return upcoming
 
-def get_upcoming_events(client, days_ahead=14):
+def get_upcoming_events(client, days_ahead=14, exclude_types=('assign',)):
     """
     Get all upcoming calendar events within the specified number of days
     
     Args:
         client: MoodleAPIClient instance
         days_ahead: Number of days to look ahead for events
+        exclude_types: Event types to skip (assignments are listed separately)
         
     Returns:
         List of upcoming events sorted by date
@@ -86,24 +88,22 @@ def get_upcoming_events(client, days_ahead=14):
     # Get calendar events
     events_data = client.get_calendar_events(events_from=from_date, events_to=to_date)
     
-    # Process events
-    upcoming_events = []
-    
-    if 'events' in events_data:
-        for event in events_data['events']:
-            event_time = datetime.fromtimestamp(event.get('timestart', 0))
-            
-            upcoming_events.append({
-                'name': event.get('name', 'Unnamed event'),
-                'description': event.get('description', ''),
-                'course_name': event.get('course', {}).get('fullname', 'N/A'),
-                'date': event_time,
-                'type': event.get('eventtype', 'unknown'),
-                'id': event.get('id')
-            })
+    # Filter and build events in a single pass over the response
+    upcoming_events = [
+        {
+            'name': event.get('name', 'Unnamed event'),
+            'description': event.get('description', ''),
+            'course_name': event.get('course', {}).get('fullname', 'N/A'),
+            'date': datetime.fromtimestamp(event.get('timestart', 0)),
+            'type': event_type,
+            'id': event.get('id')
+        }
+        for event in events_data.get('events', [])
+        if (event_type := event.get('eventtype', 'unknown')) not in exclude_types
+    ]
     
     # Sort by date
-    upcoming_events.sort(key=lambda x: x['date'])
+    upcoming_events.sort(key=itemgetter('date'))
     
     return upcoming_events
 
@@ -144,12 +144,9 @@ def main():
     else:
         print("No upcoming assignments found.")
     
-    # Get upcoming events
+    # Get upcoming events (assignment events are excluded to avoid duplication)
     events = get_upcoming_events(client, days_ahead)
     
-    # Filter out assignment events to avoid duplication
-    events = [e for e in events if e['type'] != 'assign']
-    
     # Display events
     if events:
         print(f"\nFound {len(events)} upcoming events:")
@@ -9,11 +9,10 @@ and store the analysis in a SQLite database.
 import os
 import sqlite3
 import logging
+import threading
 import json
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Iterator, Optional
 from datetime import datetime
-import openai
-from openai import OpenAI
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -25,6 +24,19 @@ class GradeAnalyzer:
     in a SQLite database.
     """
     
+    # Queries on grade_analysis. Passing the same string each time lets sqlite3
+    # reuse the statement it compiled for the first analysis page
+    _SQL_INSERT = 'INSERT INTO grade_analysis (course_id, analysis, created_at, digest) VALUES (?, ?, ?, ?)'
+    _SQL_GET = 'SELECT * FROM grade_analysis WHERE id = ?'
+    _SQL_GET_BY_DIGEST = '''
+    SELECT * FROM grade_analysis
+    WHERE course_id = ? AND digest = ?
+    ORDER BY created_at DESC
+    LIMIT 1
+    '''
+    _SQL_LIST_COURSE = 'SELECT * FROM grade_analysis WHERE course_id = ? ORDER BY created_at DESC'
+    _SQL_DELETE = 'DELETE FROM grade_analysis WHERE id = ?'
+    
     def __init__(self, api_key: str = None, db_path: str = None):
         """
         Initialize the GradeAnalyzer with OpenAI API key and database path
@@ -38,20 +50,30 @@ class GradeAnalyzer:
         if not self.api_key:
             raise ValueError("OpenAI API key is required. Set it in config.py or pass it to the constructor.")
         
-        self.client = OpenAI(api_key=self.api_key)
+        # The OpenAI client is created on first use (see the client property)
+        self._client = None
         
-        # Set up database
+        # Set up database. The web app shares one GradeAnalyzer between request
+        # threads and background analysis jobs, so it keeps a single autocommit
+        # connection and takes the lock around each statement
         self.db_path = db_path or os.path.join(os.path.dirname(os.path.abspath(__file__)), 'grade_analysis.db')
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
         self._init_db()
     
     def _init_db(self):
         """Initialize the SQLite database with required tables"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            # Create table for grade analysis
-            cursor.execute('''
+            with self._lock:
+                self._conn.executescript('''
+                PRAGMA journal_mode=WAL;
+                PRAGMA synchronous=NORMAL;
+                PRAGMA temp_store=MEMORY;
+                ''')
+                
+                # Create table for grade analysis
+                self._conn.execute('''
             CREATE TABLE IF NOT EXISTS grade_analysis (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 course_id INTEGER NOT NULL,
@@ -60,14 +82,26 @@ class GradeAnalyzer:
                 UNIQUE(course_id, created_at)
             )
             ''')
+                
+                # Digest of the grade data each analysis was generated from, added to older databases
+                columns = {row['name'] for row in self._conn.execute('PRAGMA table_info(grade_analysis)')}
+                if 'digest' not in columns:
+                    self._conn.execute('ALTER TABLE grade_analysis ADD COLUMN digest TEXT')
+                self._conn.execute('CREATE INDEX IF NOT EXISTS idx_grade_analysis_course_digest ON grade_analysis(course_id, digest)')
             
-            conn.commit()
-            conn.close()
             logger.info(f"Database initialized at {self.db_path}")
         except Exception as e:
             logger.error(f"Error initializing database: {e}")
             raise
     
+    @property
+    def client(self):
+        """OpenAI client, created on the first generate_analysis call; viewing stored analyses never imports openai"""
+        if self._client is None:
+            from openai import OpenAI
+            self._client = OpenAI(api_key=self.api_key)
+        return self._client
+    
     def generate_analysis(self, grades_data: List[Dict[str, Any]]) -> str:
         """
         Generate an analysis of grades using OpenAI's GPT model
@@ -100,30 +134,26 @@ class GradeAnalyzer:
             logger.error(f"Error generating grade analysis: {e}")
             raise
     
-    def store_analysis(self, course_id: int, analysis: str) -> int:
+    def store_analysis(self, course_id: int, analysis: str, digest: Optional[str] = None) -> int:
         """
         Store a grade analysis in the database
         
         Args:
             course_id: ID of the course
             analysis: Generated analysis text
+            digest: Optional digest of the grade data the analysis was generated from
             
         Returns:
             ID of the stored analysis
         """
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
             # Store analysis
-            cursor.execute(
-                'INSERT INTO grade_analysis (course_id, analysis, created_at) VALUES (?, ?, ?)',
-                (course_id, analysis, datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
-            )
-            
+            with self._lock:
+                cursor = self._conn.execute(
+                    self._SQL_INSERT,
+                    (course_id, analysis, datetime.now().strftime('%Y-%m-%d %H:%M:%S'), digest)
+                )
             analysis_id = cursor.lastrowid
-            conn.commit()
-            conn.close()
             
             logger.info(f"Analysis stored with ID {analysis_id}")
             return analysis_id
@@ -131,13 +161,15 @@ class GradeAnalyzer:
             logger.error(f"Error storing analysis in database: {e}")
             raise
     
-    def analyze_grades(self, course_id: int, grades_data: List[Dict[str, Any]]) -> str:
+    def analyze_grades(self, course_id: int, grades_data: List[Dict[str, Any]],
+                       digest: Optional[str] = None) -> str:
         """
         Analyze grades and store the analysis
         
         Args:
             course_id: ID of the course
             grades_data: List of grade items with their details
+            digest: Optional digest of grades_data, stored so get_analysis_by_digest can find it
             
         Returns:
             Generated analysis
@@ -147,7 +179,7 @@ class GradeAnalyzer:
             analysis = self.generate_analysis(grades_data)
             
             # Store analysis in database
-            self.store_analysis(course_id, analysis)
+            self.store_analysis(course_id, analysis, digest)
             
             return analysis
         except Exception as e:
@@ -165,15 +197,9 @@ class GradeAnalyzer:
             Analysis dictionary if found, None otherwise
         """
         try:
-            conn = sqlite3.connect(self.db_path)
-            conn.row_factory = sqlite3.Row
-            cursor = conn.cursor()
-            
             # Get analysis
-            cursor.execute('SELECT * FROM grade_analysis WHERE id = ?', (analysis_id,))
-            
-            row = cursor.fetchone()
-            conn.close()
+            with self._lock:
+                row = self._conn.execute(self._SQL_GET, (analysis_id,)).fetchone()
             
             if row:
                 return dict(row)
@@ -183,29 +209,64 @@ class GradeAnalyzer:
             logger.error(f"Error getting analysis from database: {e}")
             return None
     
-    def get_all_analyses(self, course_id: int) -> List[Dict[str, Any]]:
+    def get_analysis_by_digest(self, course_id: int, digest: str) -> Optional[Dict[str, Any]]:
         """
-        Get all analyses for a course from the database
+        Get the newest analysis of a course generated from grade data with the given digest
         
         Args:
             course_id: ID of the course
+            digest: Digest of the grade data
             
         Returns:
-            List of analysis dictionaries
+            Analysis dictionary if found, None otherwise
         """
         try:
-            conn = sqlite3.connect(self.db_path)
-            conn.row_factory = sqlite3.Row
-            cursor = conn.cursor()
+            with self._lock:
+                row = self._conn.execute(self._SQL_GET_BY_DIGEST, (course_id, digest)).fetchone()
             
-            # Get analyses
-            cursor.execute('SELECT * FROM grade_analysis WHERE course_id = ? ORDER BY created_at DESC', (course_id,))
+            return dict(row) if row else None
+        except Exception as e:
+            logger.error(f"Error getting analysis from database: {e}")
+            return None
+    
+    def iter_analyses(self, course_id: int) -> Iterator[Dict[str, Any]]:
+        """
+        Stream all analyses for a course from the database, newest first
+        
+        Rows are read from the cursor one at a time instead of being fetched
+        into a list up front; the connection is closed once the generator is
+        exhausted or discarded. The generator uses a connection of its own so
+        that a partly consumed one doesn't hold the shared connection's lock.
+        
+        Args:
+            course_id: ID of the course
             
-            rows = cursor.fetchall()
-            analyses = [dict(row) for row in rows]
+        Yields:
+            Analysis dictionaries
+        """
+        conn = sqlite3.connect(self.db_path)
+        try:
+            conn.row_factory = sqlite3.Row
+            cursor = conn.execute(self._SQL_LIST_COURSE, (course_id,))
+            for row in cursor:
+                yield dict(row)
+        finally:
             conn.close()
+    
+    def get_all_analyses(self, course_id: int) -> List[Dict[str, Any]]:
+        """
+        Get all analyses for a course from the database
+        
+        Collects iter_analyses(); use that directly to process rows as they are read.
+        
+        Args:
+            course_id: ID of the course
             
-            return analyses
+        Returns:
+            List of analysis dictionaries
+        """
+        try:
+            return list(self.iter_analyses(course_id))
         except Exception as e:
             logger.error(f"Error getting analyses from database: {e}")
             return []
@@ -221,20 +282,25 @@ class GradeAnalyzer:
             True if successful, False otherwise
         """
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
             # Delete analysis
-            cursor.execute('DELETE FROM grade_analysis WHERE id = ?', (analysis_id,))
-            
-            conn.commit()
-            conn.close()
+            with self._lock:
+                self._conn.execute(self._SQL_DELETE, (analysis_id,))
             
             logger.info(f"Analysis {analysis_id} deleted successfully")
             return True
         except Exception as e:
             logger.error(f"Error deleting analysis from database: {e}")
             return False
+    
+    def close(self) -> None:
+        """Close the shared connection; connections opened by iter_analyses close themselves"""
+        conn = getattr(self, '_conn', None)
+        if conn is not None:
+            conn.close()
+            self._conn = None
+    
+    def __del__(self):
+        self.close()
 
 
 if __name__ == "__main__":
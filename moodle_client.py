@@ -4,12 +4,32 @@ Moodle API Client for Concordia University
 This module provides a client for interacting with Concordia University's Moodle web services API.
 """
 
+import hashlib
 import requests
-from typing import Dict, Any, List, Optional
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from typing import Dict, Any, List, Optional, Tuple
 import json
 import os
 from urllib.parse import urljoin
 
+# Prefer a C-accelerated JSON decoder for API responses when one is installed
+try:
+    import orjson as _json
+except ImportError:
+    try:
+        import ujson as _json
+    except ImportError:
+        _json = json
+
+# Optional lazy parser for large payloads where only a few fields are needed
+try:
+    import simdjson
+except ImportError:
+    simdjson = None
+
 try:
     import config
 except ImportError:
@@ -20,6 +40,13 @@ except ImportError:
         API_TOKEN = None
         DEFAULT_PARAMS = {"moodlewsrestformat": "json"}
 
+# Number of (function, parameters) responses each client remembers for skipping re-parses
+RESPONSE_CACHE_SIZE = 64
+
+
+class MoodleAPIError(Exception):
+    """Error returned by the Moodle web services API (an 'exception' payload)."""
+
 
 class MoodleAPIClient:
     """Client for interacting with Moodle's Web Services API."""
@@ -50,8 +77,41 @@ class MoodleAPIClient:
             "wstoken": self.token,
             **config.DEFAULT_PARAMS
         }
+        
+        # Fixed part of the request body for each web service function,
+        # built on first use (see _make_request)
+        self._base_params: Dict[str, Dict[str, Any]] = {}
+        
+        # Shared HTTP session so repeated calls reuse a pooled keep-alive connection
+        self._session = requests.Session()
+        self._session.mount("https://", HTTPAdapter(
+            pool_connections=4,
+            pool_maxsize=16,
+            # Web service calls here are read-only, so retrying POSTs is safe
+            max_retries=Retry(total=3, backoff_factor=0.2, status_forcelist=[502, 503, 504],
+                              allowed_methods=frozenset({"GET", "POST"}))
+        ))
+        # Ask for compressed JSON explicitly; some Moodle installs only
+        # compress when the encoding is negotiated
+        self._session.headers.update({
+            "Accept": "application/json",
+            "Accept-Encoding": "gzip, deflate",
+            "Connection": "keep-alive"
+        })
+        
+        # Per-client caches: site info and function availability don't change
+        # for the lifetime of a token, and enrolled courses rarely do
+        self._site_info: Optional[Dict[str, Any]] = None
+        self._fn_cache: Dict[str, bool] = {}
+        self._available_functions: Optional[set] = None
+        self._courses: Optional[List[Dict[str, Any]]] = None
+        
+        # Last response digest and parsed result per (function, parameters),
+        # least recently used first and capped at RESPONSE_CACHE_SIZE entries
+        self._response_cache: "OrderedDict[Tuple[str, str], Tuple[bytes, Any]]" = OrderedDict()
     
-    def _make_request(self, wsfunction: str, additional_params: Dict[str, Any] = None, handle_errors: bool = True) -> Dict[str, Any]:
+    def _make_request(self, wsfunction: str, additional_params: Dict[str, Any] = None, handle_errors: bool = True,
+                      lazy: bool = False) -> Dict[str, Any]:
         """
         Make a request to the Moodle API.
         
@@ -59,44 +119,84 @@ class MoodleAPIClient:
             wsfunction: The Moodle web service function to call
             additional_params: Additional parameters to include in the request
             handle_errors: Whether to raise exceptions for API errors
+            lazy: Return a simdjson document proxy instead of Python objects
+                  (requires pysimdjson; ignored when it isn't installed)
             
         Returns:
-            The JSON response from the API
+            The JSON response from the API. When a response is byte-identical
+            to the previous one for the same call, the previously parsed
+            object is returned again, so callers should not modify it.
         """
-        params = {
-            "wsfunction": wsfunction,
-            **self.default_params
-        }
+        base_params = self._base_params.get(wsfunction)
+        if base_params is None:
+            base_params = self._base_params[wsfunction] = {
+                "wsfunction": wsfunction,
+                **self.default_params
+            }
         
-        if additional_params:
-            params.update(additional_params)
+        params = {**base_params, **additional_params} if additional_params else base_params
         
         try:
-            response = requests.get(self.ws_endpoint, params=params)
+            # Send parameters as a form body so the token stays out of the URL
+            # and large parameter lists don't grow the request line
+            response = self._session.post(self.ws_endpoint, data=params, timeout=(5, 30))
             
             # Check for HTTP errors
             response.raise_for_status()
             
             # Parse the response
-            data = response.json()
+            cache_key = None
+            if lazy and simdjson is not None:
+                # A fresh parser per call: a parser can't be reused while
+                # documents from it are still alive
+                data = simdjson.Parser().parse(response.content)
+                is_object = isinstance(data, simdjson.Object)
+            else:
+                # Skip parsing when the payload hasn't changed since the
+                # last identical call (e.g. a refreshed dashboard)
+                cache_key = (wsfunction, json.dumps(additional_params, sort_keys=True, default=str))
+                digest = hashlib.blake2b(response.content, digest_size=16).digest()
+                cached = self._response_cache.get(cache_key)
+                if cached is not None and cached[0] == digest:
+                    self._response_cache.move_to_end(cache_key)
+                    return cached[1]
+                
+                data = _json.loads(response.content)
+                is_object = isinstance(data, dict)
             
             # Check for Moodle API errors
-            if isinstance(data, dict) and data.get('exception'):
+            if is_object and data.get('exception'):
                 error_msg = f"Moodle API error: {data.get('message', 'Unknown error')}"
                 if handle_errors:
-                    raise Exception(error_msg)
+                    raise MoodleAPIError(error_msg)
                 else:
                     print(f"Warning: {error_msg}")
                     return {"error": error_msg}
-                
+            
+            if cache_key is not None:
+                self._response_cache[cache_key] = (digest, data)
+                self._response_cache.move_to_end(cache_key)
+                if len(self._response_cache) > RESPONSE_CACHE_SIZE:
+                    self._response_cache.popitem(last=False)
             return data
-        except requests.exceptions.RequestException as e:
+        except (requests.exceptions.RequestException, ValueError) as e:
+            # ValueError covers malformed JSON from any of the decoders
             if handle_errors:
                 raise
             else:
                 print(f"Warning: Request failed: {e}")
                 return {"error": str(e)}
     
+    def close(self):
+        """Close the underlying HTTP session and its pooled connections."""
+        self._session.close()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+    
     def is_function_available(self, wsfunction: str) -> bool:
         """
         Check if a specific Moodle API function is available.
@@ -107,56 +207,125 @@ class MoodleAPIClient:
         Returns:
             True if the function is available, False otherwise
         """
+        if wsfunction not in self._fn_cache:
+            # Site info lists every function the token may call; only probe
+            # the function directly when that list isn't available
+            available = self._get_available_functions()
+            if available is not None:
+                self._fn_cache[wsfunction] = wsfunction in available
+            else:
+                exists = self._probe_function(wsfunction)
+                if exists is None:
+                    # No definite answer (e.g. a network error); ask again next time
+                    return False
+                self._fn_cache[wsfunction] = exists
+        return self._fn_cache[wsfunction]
+    
+    def _get_available_functions(self) -> Optional[set]:
+        """Names of the functions listed in site info, or None if they aren't listed."""
+        if self._available_functions is None:
+            try:
+                functions = self.get_site_info().get('functions')
+            except Exception:
+                return None
+            if functions is None:
+                return None
+            self._available_functions = {function.get('name') for function in functions}
+        return self._available_functions
+    
+    def _probe_function(self, wsfunction: str) -> Optional[bool]:
+        """
+        Call a function with no parameters to find out whether it exists.
+        
+        Returns:
+            True or False when Moodle answered, None when the request itself
+            failed and nothing is known about the function
+        """
         try:
             # Try to call the function with minimal parameters
-            result = self._make_request(wsfunction, handle_errors=False)
+            self._make_request(wsfunction)
+            return True
+        except MoodleAPIError as e:
             # If we get an 'invalid parameter' error, the function exists but needs parameters
             # If we get a 'access control exception', the function exists but we don't have permission
             # If we get a 'function does not exist', the function is not available
-            
-            if isinstance(result, dict) and result.get('error'):
-                error = result.get('error')
-                if "does not exist" in error:
-                    return False
-                # Other errors might indicate the function exists but needs parameters or permissions
-                return True
-            return True
-        except Exception:
-            return False
+            return "does not exist" not in str(e)
+        except (requests.exceptions.RequestException, ValueError):
+            return None
     
     def get_site_info(self) -> Dict[str, Any]:
         """
         Get information about the Moodle site.
         
+        The result is cached on the client after the first successful call.
+        
         Returns:
             Site information including version, user details, etc.
         """
-        return self._make_request("core_webservice_get_site_info")
+        if self._site_info is None:
+            self._site_info = self._make_request("core_webservice_get_site_info")
+        return self._site_info
     
-    def get_courses(self) -> List[Dict[str, Any]]:
+    def get_courses(self, refresh: bool = False) -> List[Dict[str, Any]]:
         """
         Get the list of courses the user is enrolled in.
         
+        The result is cached on the client, so repeated calls within one
+        script run don't hit the API again.
+        
+        Args:
+            refresh: Whether to bypass the cached list and fetch it again
+            
         Returns:
             List of course information
         """
-        return self._make_request("core_enrol_get_users_courses", {
-            "userid": self.get_site_info().get("userid")
-        })
+        if self._courses is None or refresh:
+            self._courses = self._make_request("core_enrol_get_users_courses", {
+                "userid": self.get_site_info().get("userid")
+            })
+        return self._courses
     
-    def get_course_contents(self, course_id: int) -> List[Dict[str, Any]]:
+    def get_course_contents(self, course_id: int, lazy: bool = False) -> List[Dict[str, Any]]:
         """
         Get the contents of a specific course.
         
         Args:
             course_id: The ID of the course
+            lazy: Return a simdjson document proxy when pysimdjson is
+                  installed; use with extract_modules()
             
         Returns:
             List of course sections with their contents
         """
         return self._make_request("core_course_get_contents", {
             "courseid": course_id
-        })
+        }, lazy=lazy)
+    
+    def get_many_course_contents(self, course_ids: List[int], max_workers: int = 8,
+                                 return_exceptions: bool = False) -> Dict[int, Any]:
+        """
+        Get the contents of several courses concurrently.
+        
+        Requests are I/O-bound, so they are overlapped on a thread pool that
+        shares the client's pooled session.
+        
+        Args:
+            course_ids: The IDs of the courses
+            max_workers: Maximum number of concurrent requests
+            return_exceptions: If True, a course whose request fails maps to
+                the exception instead of the first failure being raised
+            
+        Returns:
+            Dictionary mapping each course ID to its list of sections
+        """
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {
+                course_id: executor.submit(self.get_course_contents, course_id)
+                for course_id in course_ids
+            }
+            if not return_exceptions:
+                return {course_id: future.result() for course_id, future in futures.items()}
+            return {course_id: future.exception() or future.result() for course_id, future in futures.items()}
     
     def get_calendar_events(self, 
                            events_from: Optional[str] = None, 
@@ -232,6 +401,34 @@ class MoodleAPIClient:
             return {"usergrades": [], "warnings": [{"message": str(e)}]}
 
 
+def extract_modules(sections) -> List[Dict[str, Any]]:
+    """
+    Flatten course sections into the module fields callers typically need.
+    
+    Works on both regular parsed JSON and lazy simdjson documents; with the
+    latter, only the fields read here are converted into Python objects.
+    
+    Args:
+        sections: Course contents as returned by get_course_contents()
+        
+    Returns:
+        List of modules with their id, name, type and file names/URLs
+    """
+    modules = []
+    for section in sections:
+        for module in section.get('modules', []):
+            modules.append({
+                'id': module.get('id'),
+                'name': module.get('name', ''),
+                'modname': module.get('modname', ''),
+                'files': [
+                    {'filename': content.get('filename', ''), 'fileurl': content.get('fileurl', '')}
+                    for content in module.get('contents', [])
+                ]
+            })
+    return modules
+
+
 if __name__ == "__main__":
     # Example usage
     try:
@@ -4,33 +4,128 @@ PDF Summarizer Module
 Extracts text from PDFs and generates summaries using OpenAI's API
 """
 
+import asyncio
+import hashlib
+import multiprocessing
 import os
 import sqlite3
 import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
 from pathlib import Path
 from typing import Dict, Any, List, Optional, Tuple, Union
 import logging
 
-# PDF text extraction
-import PyPDF2
+# PDF text extraction (PDFium is native and much faster; PyPDF2 is the
+# fallback). PyPDF2, openai and tiktoken are heavy to import, so they are
+# imported where they're first used rather than here.
+try:
+    import pypdfium2 as pdfium
+except ImportError:
+    pdfium = None
 
-# OpenAI API for summarization
-import openai
-from openai import OpenAI
+# Dictionary compression of stored summaries (optional)
+try:
+    import zstandard as zstd
+except ImportError:
+    zstd = None
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
 logger = logging.getLogger('pdf_summarizer')
 
 # Default database path
 DEFAULT_DB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'summaries.db')
 
+# Maximum number of input tokens sent to the model for one summary
+MAX_INPUT_TOKENS = 4000
+
+# PyPDF2 extraction is pure Python, so longer documents are split across
+# processes in chunks of this many pages
+PAGES_PER_TASK = 4
+PARALLEL_MIN_PAGES = 2 * PAGES_PER_TASK
+EXTRACT_WORKERS = min(4, os.cpu_count() or 1)
+
+# Summaries are stored as plain text until this many exist; a zstd dictionary
+# is then trained on them and later summaries are stored compressed with it
+ZSTD_TRAINING_SAMPLES = 100
+ZSTD_DICT_SIZE = 16384
+
+
+def hash_file(path: str) -> str:
+    """Return the hex SHA-256 digest of a file's contents"""
+    with open(path, 'rb') as file:
+        if hasattr(hashlib, 'file_digest'):
+            return hashlib.file_digest(file, 'sha256').hexdigest()
+        digest = hashlib.sha256()
+        for block in iter(lambda: file.read(1 << 20), b''):
+            digest.update(block)
+        return digest.hexdigest()
+
+
+_extract_pool = None
+_extract_pool_lock = threading.Lock()
+
+
+def _get_extract_pool() -> ProcessPoolExecutor:
+    """
+    Process pool for PyPDF2 extraction, created on first use and shared by all callers
+    
+    Workers are spawned rather than forked, since summaries are made from
+    background threads and forking a multithreaded process is unsafe.
+    """
+    global _extract_pool
+    with _extract_pool_lock:
+        if _extract_pool is None:
+            _extract_pool = ProcessPoolExecutor(max_workers=EXTRACT_WORKERS,
+                                                mp_context=multiprocessing.get_context('spawn'))
+        return _extract_pool
+
+
+def _extract_page_range(pdf_path: str, start: int, stop: int) -> List[str]:
+    """Extract the text of pages [start, stop) with PyPDF2 (runs in a worker process)"""
+    import PyPDF2
+    
+    with open(pdf_path, 'rb') as file:
+        reader = PyPDF2.PdfReader(file)
+        return [reader.pages[i].extract_text() or "" for i in range(start, stop)]
+
+
 class PDFSummarizer:
     """Class for extracting text from PDFs and generating summaries using OpenAI API"""
     
+    # Model used for summaries, and its tiktoken encoding (shared by all
+    # instances; False once loading it has failed)
+    MODEL = "gpt-3.5-turbo"
+    _encoding = None
+    
+    # SQL used on every call, kept as single constants so each one is parsed
+    # once and then served from the connection's prepared statement cache
+    _SQL_INSERT = '''
+    INSERT OR REPLACE INTO summaries 
+    (course_id, module_id, file_name, file_path, summary, sha256)
+    VALUES (?, ?, ?, ?, ?, ?)
+    '''
+    _SQL_GET = '''
+    SELECT summary FROM summaries
+    WHERE course_id = ? AND module_id = ? AND file_name = ?
+    '''
+    _SQL_GET_BY_HASH = 'SELECT summary FROM summaries WHERE sha256 = ? LIMIT 1'
+    _SQL_LIST_COURSE = '''
+    SELECT id, course_id, module_id, file_name, file_path, summary, created_at, sha256
+    FROM summaries
+    WHERE course_id = ?
+    ORDER BY created_at DESC
+    LIMIT ? OFFSET ?
+    '''
+    _SQL_LIST_ALL = '''
+    SELECT id, course_id, module_id, file_name, file_path, summary, created_at, sha256
+    FROM summaries
+    ORDER BY created_at DESC
+    LIMIT ? OFFSET ?
+    '''
+    _SQL_GET_BY_ID = 'SELECT * FROM summaries WHERE id = ?'
+    _SQL_DELETE = 'DELETE FROM summaries WHERE id = ?'
+    
     def __init__(self, api_key: Optional[str] = None, db_path: str = DEFAULT_DB_PATH):
         """
         Initialize the PDF summarizer
@@ -44,20 +139,33 @@ class PDFSummarizer:
         if not self.api_key:
             raise ValueError("OpenAI API key is required. Set it in config.py or pass it to the constructor.")
         
-        self.client = OpenAI(api_key=self.api_key)
+        # The OpenAI client is created on first use (see the client property)
+        self._client = None
         
-        # Set up database
+        # Set up database: one autocommit connection per instance, shared
+        # across threads and serialized with a lock
         self.db_path = db_path
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        self._cctx = None
+        self._dctx = None
+        self._dict_training_failed = False
         self._init_db()
     
     def _init_db(self):
         """Initialize the SQLite database for storing summaries"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            # Create summaries table if it doesn't exist
-            cursor.execute('''
+            with self._lock:
+                self._conn.executescript('''
+                PRAGMA journal_mode=WAL;
+                PRAGMA synchronous=NORMAL;
+                PRAGMA temp_store=MEMORY;
+                PRAGMA cache_size=-20000;
+                ''')
+                
+                # Create summaries table if it doesn't exist
+                self._conn.execute('''
             CREATE TABLE IF NOT EXISTS summaries (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 course_id INTEGER NOT NULL,
@@ -69,21 +177,36 @@ class PDFSummarizer:
                 UNIQUE(course_id, module_id, file_name)
             )
             ''')
+                
+                # Content hash of the summarized file, added to older databases
+                columns = {row['name'] for row in self._conn.execute('PRAGMA table_info(summaries)')}
+                if 'sha256' not in columns:
+                    self._conn.execute('ALTER TABLE summaries ADD COLUMN sha256 TEXT')
+                
+                # Serves both the course filter and the newest-first ordering
+                self._conn.execute('''
+                CREATE INDEX IF NOT EXISTS idx_summaries_course_created
+                ON summaries(course_id, created_at DESC)
+                ''')
+                self._conn.execute('CREATE INDEX IF NOT EXISTS idx_summaries_sha256 ON summaries(sha256)')
+                
+                # Key/value store for the summary compression dictionary
+                self._conn.execute('CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value BLOB)')
+                self._load_zstd_dict()
             
-            conn.commit()
-            conn.close()
             logger.info(f"Database initialized at {self.db_path}")
         except Exception as e:
             logger.error(f"Error initializing database: {e}")
             raise
     
-    def extract_text_from_pdf(self, pdf_path: str, max_pages: int = 50) -> str:
+    def extract_text_from_pdf(self, pdf_path: str, max_pages: int = 50, max_chars: Optional[int] = None) -> str:
         """
         Extract text from a PDF file
         
         Args:
             pdf_path: Path to the PDF file
             max_pages: Maximum number of pages to extract (to avoid very large files)
+            max_chars: Optional character budget; extraction stops once it is reached
             
         Returns:
             Extracted text from the PDF
@@ -91,28 +214,73 @@ class PDFSummarizer:
         try:
             logger.info(f"Extracting text from {pdf_path}")
             
-            with open(pdf_path, 'rb') as file:
-                reader = PyPDF2.PdfReader(file)
-                num_pages = len(reader.pages)
-                
-                # Limit the number of pages to process
-                pages_to_process = min(num_pages, max_pages)
-                if num_pages > max_pages:
-                    logger.warning(f"PDF has {num_pages} pages, only processing first {max_pages}")
-                
-                # Extract text from each page
-                text = ""
-                for i in range(pages_to_process):
-                    page = reader.pages[i]
-                    text += page.extract_text() + "\n\n"
-                
-                logger.info(f"Successfully extracted {pages_to_process} pages from {pdf_path}")
-                return text
+            # Extract text from each page, stopping early once the budget is
+            # spent; the last page is trimmed to fit so the pages are joined
+            # into the final string exactly once
+            parts = []
+            remaining = max_chars
+            for page_text in self._iter_page_texts(pdf_path, max_pages):
+                if remaining is not None and len(page_text) + 2 >= remaining:
+                    parts.append(page_text[:remaining])
+                    logger.info(f"Reached {max_chars} character budget after {len(parts)} pages")
+                    break
+                parts.append(page_text)
+                if remaining is not None:
+                    remaining -= len(page_text) + 2
+            else:
+                # Keep the separator after the last page
+                parts.append("")
+            
+            text = "\n\n".join(parts)
+            logger.info(f"Successfully extracted text from {pdf_path}")
+            return text
         except Exception as e:
             logger.error(f"Error extracting text from PDF: {e}")
             raise
     
-    def generate_summary(self, text: str, max_tokens: int = 4000) -> str:
+    def _iter_page_texts(self, pdf_path: str, max_pages: int):
+        """Yield the text of each page, using PDFium when installed and PyPDF2 otherwise"""
+        if pdfium is not None:
+            pdf = pdfium.PdfDocument(pdf_path)
+            try:
+                pages_to_process = self._page_limit(len(pdf), max_pages)
+                for i in range(pages_to_process):
+                    page = pdf[i]
+                    textpage = page.get_textpage()
+                    yield textpage.get_text_range()
+                    textpage.close()
+                    page.close()
+            finally:
+                pdf.close()
+        else:
+            import PyPDF2
+            
+            with open(pdf_path, 'rb') as file:
+                num_pages = len(PyPDF2.PdfReader(file).pages)
+            pages_to_process = self._page_limit(num_pages, max_pages)
+            
+            if pages_to_process < PARALLEL_MIN_PAGES:
+                yield from _extract_page_range(pdf_path, 0, pages_to_process)
+                return
+            
+            starts = range(0, pages_to_process, PAGES_PER_TASK)
+            stops = (min(start + PAGES_PER_TASK, pages_to_process) for start in starts)
+            chunks = _get_extract_pool().map(_extract_page_range, repeat(pdf_path), starts, stops)
+            try:
+                for chunk in chunks:
+                    yield from chunk
+            finally:
+                # Cancel pending chunks if the caller stopped early (e.g. budget reached)
+                chunks.close()
+    
+    @staticmethod
+    def _page_limit(num_pages: int, max_pages: int) -> int:
+        """Limit the number of pages to process, warning when pages are skipped"""
+        if num_pages > max_pages:
+            logger.warning(f"PDF has {num_pages} pages, only processing first {max_pages}")
+        return min(num_pages, max_pages)
+    
+    def generate_summary(self, text: str, max_tokens: int = MAX_INPUT_TOKENS) -> str:
         """
         Generate a summary of the text using OpenAI API
         
@@ -126,21 +294,10 @@ class PDFSummarizer:
         try:
             logger.info("Generating summary using OpenAI API")
             
-            # Truncate text if it's too long (rough estimate: 1 token ≈ 4 chars)
-            if len(text) > max_tokens * 4:
-                logger.warning(f"Text is too long ({len(text)} chars), truncating to ~{max_tokens} tokens")
-                text = text[:max_tokens * 4]
+            text = self._truncate_to_tokens(text, max_tokens)
             
             # Generate summary using OpenAI API
-            response = self.client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=[
-                    {"role": "system", "content": "You are a helpful assistant that summarizes academic lecture notes and materials. Create a concise but comprehensive summary that captures the key concepts, definitions, and important points from the provided text. Format your summary with clear sections and bullet points where appropriate."},
-                    {"role": "user", "content": f"Please summarize the following lecture material:\n\n{text}"}
-                ],
-                max_tokens=1000,
-                temperature=0.5
-            )
+            response = self.client.chat.completions.create(**self._completion_params(text))
             
             summary = response.choices[0].message.content
             logger.info("Summary generated successfully")
@@ -149,36 +306,208 @@ class PDFSummarizer:
             logger.error(f"Error generating summary: {e}")
             raise
     
-    def summarize_pdf(self, pdf_path: str, course_id: int, module_id: int, filename: str = None) -> str:
+    @property
+    def client(self):
+        """OpenAI client, imported and created lazily so non-summarizing use skips the import"""
+        if self._client is None:
+            from openai import OpenAI
+            self._client = OpenAI(api_key=self.api_key)
+        return self._client
+    
+    def _completion_params(self, text: str) -> Dict[str, Any]:
+        """Build the chat completion request for summarizing already-truncated text"""
+        return {
+            "model": self.MODEL,
+            "messages": [
+                {"role": "system", "content": "You are a helpful assistant that summarizes academic lecture notes and materials. Create a concise but comprehensive summary that captures the key concepts, definitions, and important points from the provided text. Format your summary with clear sections and bullet points where appropriate."},
+                {"role": "user", "content": f"Please summarize the following lecture material:\n\n{text}"}
+            ],
+            "max_tokens": 1000,
+            "temperature": 0.5
+        }
+    
+    @classmethod
+    def _get_encoding(cls):
+        """Load the model's tiktoken encoding once, or return None if it's unavailable"""
+        if cls._encoding is None:
+            try:
+                import tiktoken
+            except ImportError:
+                cls._encoding = False
+                return None
+            try:
+                cls._encoding = tiktoken.encoding_for_model(cls.MODEL)
+            except Exception as e:
+                logger.warning(f"tiktoken unavailable, estimating tokens from length: {e}")
+                cls._encoding = False
+        return cls._encoding or None
+    
+    def _truncate_to_tokens(self, text: str, max_tokens: int) -> str:
+        """Truncate text to at most max_tokens tokens"""
+        encoding = self._get_encoding()
+        if encoding is None:
+            # Rough estimate: 1 token ≈ 4 chars
+            if len(text) > max_tokens * 4:
+                logger.warning(f"Text is too long ({len(text)} chars), truncating to ~{max_tokens} tokens")
+                text = text[:max_tokens * 4]
+            return text
+        
+        tokens = encoding.encode(text)
+        if len(tokens) > max_tokens:
+            logger.warning(f"Text is too long ({len(tokens)} tokens), truncating to {max_tokens} tokens")
+            text = encoding.decode(tokens[:max_tokens])
+        return text
+    
+    def summarize_pdf(self, pdf_path: str, course_id: int, module_id: int, filename: str = None,
+                      store: bool = True, sha256: Optional[str] = None) -> str:
         """
         Extract text from a PDF and generate a summary
         
+        If a byte-identical file has been summarized before, its stored summary
+        is reused instead of calling the OpenAI API again.
+        
         Args:
             pdf_path: Path to the PDF file
             course_id: ID of the course
             module_id: ID of the module
             filename: Optional name of the file (if not provided, will use basename of pdf_path)
+            store: Whether to store the summary right away; pass False when
+                   batching several files through store_summaries()
+            sha256: Precomputed content hash of the file (computed if not provided)
             
         Returns:
             Generated summary
         """
         try:
-            # Extract text from PDF
-            text = self.extract_text_from_pdf(pdf_path)
+            file_name = filename if filename else os.path.basename(pdf_path)
+            sha256 = sha256 or hash_file(pdf_path)
+            
+            # Reuse the summary of an identical file if there is one
+            summary = self.get_summary_by_hash(sha256)
+            if summary is not None:
+                logger.info(f"Reusing stored summary for identical content of {file_name}")
+                if store:
+                    self.store_summary(course_id, module_id, file_name, pdf_path, summary, sha256)
+                return summary
+            
+            # Extract text from PDF, only as much as generate_summary will use
+            text = self.extract_text_from_pdf(pdf_path, max_chars=MAX_INPUT_TOKENS * 4)
             
             # Generate summary
             summary = self.generate_summary(text)
             
             # Store summary in database
-            file_name = filename if filename else os.path.basename(pdf_path)
-            self.store_summary(course_id, module_id, file_name, pdf_path, summary)
+            if store:
+                self.store_summary(course_id, module_id, file_name, pdf_path, summary, sha256)
             
             return summary
         except Exception as e:
             logger.error(f"Error summarizing PDF: {e}")
             raise
     
-    def store_summary(self, course_id: int, module_id: int, file_name: str, file_path: str, summary: str) -> None:
+    async def asummarize_pdfs(self, items: List[Tuple[str, int, int]], max_concurrency: int = 8) -> List[str]:
+        """
+        Summarize several PDFs concurrently and store the summaries
+        
+        Text extraction runs in worker threads and the OpenAI requests are
+        overlapped, with at most max_concurrency files in flight at once.
+        Files whose content was summarized before reuse the stored summary.
+        
+        Args:
+            items: (pdf_path, course_id, module_id) tuples
+            max_concurrency: Maximum number of files processed at the same time
+            
+        Returns:
+            Generated summaries, in the same order as items
+        """
+        from openai import AsyncOpenAI
+        
+        semaphore = asyncio.Semaphore(max_concurrency)
+        client = AsyncOpenAI(api_key=self.api_key)
+        
+        async def summarize_one(pdf_path: str, course_id: int, module_id: int):
+            async with semaphore:
+                sha256 = await asyncio.to_thread(hash_file, pdf_path)
+                summary = self.get_summary_by_hash(sha256)
+                if summary is None:
+                    text = await asyncio.to_thread(self.extract_text_from_pdf, pdf_path,
+                                                   max_chars=MAX_INPUT_TOKENS * 4)
+                    text = self._truncate_to_tokens(text, MAX_INPUT_TOKENS)
+                    response = await client.chat.completions.create(**self._completion_params(text))
+                    summary = response.choices[0].message.content
+                    logger.info(f"Summary generated successfully for {pdf_path}")
+                return (course_id, module_id, os.path.basename(pdf_path), pdf_path, summary, sha256)
+        
+        try:
+            rows = await asyncio.gather(*(summarize_one(*item) for item in items))
+        except Exception as e:
+            logger.error(f"Error summarizing PDFs: {e}")
+            raise
+        finally:
+            await client.close()
+        
+        self.store_summaries(rows)
+        return [row[4] for row in rows]
+    
+    def _load_zstd_dict(self) -> None:
+        """Set up the summary (de)compressors from the stored dictionary, if there is one"""
+        if zstd is None:
+            return
+        row = self._conn.execute("SELECT value FROM meta WHERE key = 'zstd_dict'").fetchone()
+        if row:
+            dict_data = zstd.ZstdCompressionDict(row[0])
+            self._cctx = zstd.ZstdCompressor(dict_data=dict_data)
+            self._dctx = zstd.ZstdDecompressor(dict_data=dict_data)
+    
+    def _maybe_train_zstd_dict(self) -> None:
+        """Train the summary dictionary once enough plain-text summaries are stored"""
+        if zstd is None or self._cctx is not None or self._dict_training_failed:
+            return
+        samples = [
+            row[0].encode('utf-8') for row in self._conn.execute(
+                "SELECT summary FROM summaries WHERE typeof(summary) = 'text' ORDER BY id DESC LIMIT ?",
+                (ZSTD_TRAINING_SAMPLES,)
+            )
+        ]
+        if len(samples) < ZSTD_TRAINING_SAMPLES:
+            return
+        try:
+            dict_data = zstd.train_dictionary(ZSTD_DICT_SIZE, samples)
+        except zstd.ZstdError as e:
+            logger.warning(f"Could not train summary compression dictionary: {e}")
+            self._dict_training_failed = True
+            return
+        # Another process may have stored a dictionary first; always use the stored one
+        self._conn.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('zstd_dict', ?)",
+                           (dict_data.as_bytes(),))
+        self._load_zstd_dict()
+        logger.info("Trained summary compression dictionary")
+    
+    def _encode_summary(self, summary: str) -> Union[str, bytes]:
+        """Compress a summary for storage once a dictionary is available"""
+        if self._cctx is None:
+            return summary
+        return self._cctx.compress(summary.encode('utf-8'))
+    
+    def _decode_summary(self, value: Union[str, bytes]) -> str:
+        """Return the text of a stored summary, decompressing it if needed"""
+        if not isinstance(value, bytes):
+            return value
+        if self._dctx is None:
+            # Written by another process after this one loaded the dictionary
+            if zstd is None:
+                raise RuntimeError("zstandard is required to read compressed summaries")
+            self._load_zstd_dict()
+        return self._dctx.decompress(value).decode('utf-8')
+    
+    def _decode_row(self, row: sqlite3.Row) -> Dict[str, Any]:
+        """Convert a summaries row to a dictionary with the summary decoded"""
+        summary = dict(row)
+        summary['summary'] = self._decode_summary(summary['summary'])
+        return summary
+    
+    def store_summary(self, course_id: int, module_id: int, file_name: str, file_path: str, summary: str,
+                      sha256: Optional[str] = None) -> None:
         """
         Store a summary in the database
         
@@ -188,25 +517,48 @@ class PDFSummarizer:
             file_name: Name of the file
             file_path: Path to the file
             summary: Generated summary
+            sha256: Optional content hash of the file
         """
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
             # Insert or replace summary
-            cursor.execute('''
-            INSERT OR REPLACE INTO summaries 
-            (course_id, module_id, file_name, file_path, summary)
-            VALUES (?, ?, ?, ?, ?)
-            ''', (course_id, module_id, file_name, file_path, summary))
+            with self._lock:
+                self._conn.execute(self._SQL_INSERT, (course_id, module_id, file_name, file_path,
+                                                      self._encode_summary(summary), sha256))
+                self._maybe_train_zstd_dict()
             
-            conn.commit()
-            conn.close()
             logger.info(f"Summary stored in database for {file_name}")
         except Exception as e:
             logger.error(f"Error storing summary in database: {e}")
             raise
     
+    def store_summaries(self, rows: List[Tuple[int, int, str, str, str, Optional[str]]]) -> None:
+        """
+        Store several summaries in a single transaction
+        
+        Args:
+            rows: (course_id, module_id, file_name, file_path, summary, sha256) tuples
+        """
+        if not rows:
+            return
+        
+        try:
+            with self._lock:
+                self._conn.execute('BEGIN')
+                try:
+                    self._conn.executemany(self._SQL_INSERT, (
+                        (*row[:4], self._encode_summary(row[4]), row[5]) for row in rows
+                    ))
+                    self._conn.execute('COMMIT')
+                except Exception:
+                    self._conn.execute('ROLLBACK')
+                    raise
+                self._maybe_train_zstd_dict()
+            
+            logger.info(f"Stored {len(rows)} summaries in database")
+        except Exception as e:
+            logger.error(f"Error storing summaries in database: {e}")
+            raise
+    
     def get_summary(self, course_id: int, module_id: int, file_name: str) -> Optional[str]:
         """
         Get a summary from the database
@@ -220,63 +572,61 @@ class PDFSummarizer:
             Summary if found, None otherwise
         """
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
             # Get summary
-            cursor.execute('''
-            SELECT summary FROM summaries
-            WHERE course_id = ? AND module_id = ? AND file_name = ?
-            ''', (course_id, module_id, file_name))
-            
-            result = cursor.fetchone()
-            conn.close()
+            with self._lock:
+                result = self._conn.execute(self._SQL_GET, (course_id, module_id, file_name)).fetchone()
+                
+                if result:
+                    return self._decode_summary(result[0])
+                else:
+                    return None
+        except Exception as e:
+            logger.error(f"Error getting summary from database: {e}")
+            return None
+    
+    def get_summary_by_hash(self, sha256: str) -> Optional[str]:
+        """
+        Get the summary of any previously summarized file with the given content hash
+        
+        Args:
+            sha256: Hex SHA-256 digest of the file contents
             
-            if result:
-                return result[0]
-            else:
-                return None
+        Returns:
+            Summary if found, None otherwise
+        """
+        try:
+            with self._lock:
+                result = self._conn.execute(self._SQL_GET_BY_HASH, (sha256,)).fetchone()
+                
+                return self._decode_summary(result[0]) if result else None
         except Exception as e:
             logger.error(f"Error getting summary from database: {e}")
             return None
     
-    def get_all_summaries(self, course_id: Optional[int] = None) -> List[Dict[str, Any]]:
+    def get_all_summaries(self, course_id: Optional[int] = None, limit: Optional[int] = None,
+                          offset: int = 0) -> List[Dict[str, Any]]:
         """
         Get all summaries from the database
         
         Args:
             course_id: Optional course ID to filter summaries
+            limit: Optional maximum number of summaries to return
+            offset: Number of summaries to skip (used with limit for paging)
             
         Returns:
             List of summaries
         """
         try:
-            conn = sqlite3.connect(self.db_path)
-            conn.row_factory = sqlite3.Row
-            cursor = conn.cursor()
-            
-            # Get summaries
-            if course_id:
-                cursor.execute('''
-                SELECT * FROM summaries
-                WHERE course_id = ?
-                ORDER BY created_at DESC
-                ''', (course_id,))
-            else:
-                cursor.execute('''
-                SELECT * FROM summaries
-                ORDER BY created_at DESC
-                ''')
-            
-            rows = cursor.fetchall()
-            conn.close()
-            
-            # Convert rows to dictionaries
-            summaries = []
-            for row in rows:
-                summaries.append(dict(row))
-            
-            return summaries
+            # Get summaries (a negative LIMIT means no limit in SQLite)
+            paging = (-1 if limit is None else limit, offset)
+            with self._lock:
+                if course_id:
+                    cursor = self._conn.execute(self._SQL_LIST_COURSE, (course_id, *paging))
+                else:
+                    cursor = self._conn.execute(self._SQL_LIST_ALL, paging)
+                
+                # Convert rows to dictionaries
+                return [self._decode_row(row) for row in cursor]
         except Exception as e:
             logger.error(f"Error getting summaries from database: {e}")
             return []
@@ -292,20 +642,14 @@ class PDFSummarizer:
             Summary dictionary if found, None otherwise
         """
         try:
-            conn = sqlite3.connect(self.db_path)
-            conn.row_factory = sqlite3.Row
-            cursor = conn.cursor()
-            
             # Get summary
-            cursor.execute('SELECT * FROM summaries WHERE id = ?', (summary_id,))
-            
-            row = cursor.fetchone()
-            conn.close()
-            
-            if row:
-                return dict(row)
-            else:
-                return None
+            with self._lock:
+                row = self._conn.execute(self._SQL_GET_BY_ID, (summary_id,)).fetchone()
+                
+                if row:
+                    return self._decode_row(row)
+                else:
+                    return None
         except Exception as e:
             logger.error(f"Error getting summary from database: {e}")
             return None
@@ -321,23 +665,34 @@ class PDFSummarizer:
             True if successful, False otherwise
         """
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
             # Delete summary
-            cursor.execute('DELETE FROM summaries WHERE id = ?', (summary_id,))
-            
-            conn.commit()
-            conn.close()
+            with self._lock:
+                self._conn.execute(self._SQL_DELETE, (summary_id,))
             
             logger.info(f"Summary {summary_id} deleted from database")
             return True
         except Exception as e:
             logger.error(f"Error deleting summary from database: {e}")
             return False
+    
+    def close(self) -> None:
+        """Close the database connection"""
+        conn = getattr(self, '_conn', None)
+        if conn is not None:
+            conn.close()
+            self._conn = None
+    
+    def __del__(self):
+        self.close()
 
 
 if __name__ == "__main__":
+    # Configure logging for command-line use only; library users keep their own setup
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+    
     # Example usage
     try:
         import sys
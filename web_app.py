@@ -4,43 +4,249 @@ Web interface for Moodle API Client
 """
 
 import os
+import re
 import sys
 import json
 import requests
+from requests.adapters import HTTPAdapter
 from datetime import datetime, timedelta
-from flask import Flask, render_template, request, redirect, url_for, flash, session, send_file
+from flask import (Flask, Response, g, get_flashed_messages, has_app_context, make_response, render_template, request,
+                   redirect, url_for, flash, session, stream_template, stream_with_context)
+from flask.json.provider import DefaultJSONProvider
+from jinja2 import FileSystemBytecodeCache
+from markupsafe import Markup, escape
+from werkzeug.exceptions import HTTPException
 from flask_wtf import FlaskForm
 from wtforms import StringField, PasswordField, SubmitField, SelectField
 from wtforms.validators import DataRequired
 import secrets
+import hashlib
+import base64
+import binascii
 import tempfile
 import shutil
+import threading
+import functools
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
+try:
+    from asgiref.wsgi import WsgiToAsgi
+except ImportError:
+    WsgiToAsgi = None
+
+try:
+    from flask_compress import Compress
+except ImportError:
+    Compress = None
+
+try:
+    from cachetools import TTLCache
+except ImportError:
+    TTLCache = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Directory containing this file, resolved once
+HERE = Path(__file__).resolve().parent
+TEMPLATES_DIR = HERE / 'templates'
+STATIC_DIR = HERE / 'static'
+
 # Add the parent directory to the path so we can import the client
-sys.path.append(os.path.dirname(os.path.abspath(__file__)))
-from moodle_client import MoodleAPIClient
+sys.path.append(str(HERE))
+from moodle_client import MoodleAPIClient, MoodleAPIError
 from pdf_summarizer import PDFSummarizer
 from grade_analyzer import GradeAnalyzer
 import config
 
+class OrjsonProvider(DefaultJSONProvider):
+    """Flask JSON provider that encodes and decodes with orjson"""
+
+    def dumps(self, obj, **kwargs):
+        option = orjson.OPT_NON_STR_KEYS
+        if kwargs.get('sort_keys', self.sort_keys):
+            option |= orjson.OPT_SORT_KEYS
+        return orjson.dumps(obj, default=self.default, option=option).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
 # Initialize Flask app
-app = Flask(__name__)
-app.secret_key = secrets.token_hex(16)
+app = Flask(__name__, template_folder=TEMPLATES_DIR, static_folder=STATIC_DIR)
+if orjson is not None:
+    app.json = OrjsonProvider(app)
 
-# Create templates directory if it doesn't exist
-os.makedirs(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'templates'), exist_ok=True)
+def load_secret_key():
+    """
+    Get a session secret key that is stable across restarts and workers
+
+    Returns:
+        FLASK_SECRET_KEY from the environment, or a key persisted next to this file
+    """
+    key = os.environ.get('FLASK_SECRET_KEY')
+    if key:
+        return key
+
+    key_path = HERE / '.flask_secret_key'
+    try:
+        with open(key_path) as f:
+            return f.read().strip()
+    except FileNotFoundError:
+        pass
+    
+    # Write a new key to a private (0600) temp file and link it into place. The link
+    # fails if another worker got there first, in which case that worker's key is used,
+    # and readers never see a partly written file.
+    fd, tmp_path = tempfile.mkstemp(dir=HERE, prefix='.flask_secret_key.')
+    try:
+        with os.fdopen(fd, 'w') as f:
+            f.write(secrets.token_hex(32))
+        try:
+            os.link(tmp_path, key_path)
+        except FileExistsError:
+            pass
+    finally:
+        os.unlink(tmp_path)
+    
+    with open(key_path) as f:
+        return f.read().strip()
+
+app.secret_key = load_secret_key()
+
+# Templates are compiled once: outside debug mode there are no per-render mtime checks,
+# and compiled bytecode survives restarts (in Jinja's per-user 0700 temp directory,
+# whose owner it checks before loading anything from it)
+app.config['TEMPLATES_AUTO_RELOAD'] = None
+app.jinja_env.auto_reload = app.debug
+app.jinja_env.bytecode_cache = FileSystemBytecodeCache()
+
+# Compress HTML and assets on the way out when Flask-Compress is installed; it
+# prefers brotli over gzip when the brotli package is available
+app.config.update(
+    COMPRESS_MIMETYPES=['text/html', 'text/css', 'application/javascript'],
+    COMPRESS_LEVEL=6,
+    COMPRESS_MIN_SIZE=500,
+)
+if Compress is not None:
+    Compress(app)
+
+# ASGI entry point (``uvicorn web_app:asgi_app``) when asgiref is installed. Run a single
+# worker process: background jobs and their status live in that process's memory (see _jobs)
+asgi_app = WsgiToAsgi(app) if WsgiToAsgi is not None else None
 
 # Custom template filter for converting newlines to <br> tags
-@app.template_filter('nl2br')
+@functools.lru_cache(maxsize=2048)
 def nl2br(value):
-    """Convert newlines to <br> tags for display in HTML"""
+    """Convert newlines to <br> tags for display in HTML, escaping the text itself"""
     if value:
-        return value.replace('\n', '<br>')
+        return Markup('<br>\n').join(escape(value).split('\n'))
     return ''
 
-# Global variables
-moodle_client = None
+# Custom template filter for truncating text
+@functools.lru_cache(maxsize=2048)
+def truncate_filter(s, length=100):
+    if not s:
+        return ''
+    if len(s) <= length:
+        return s
+    return s[:length] + '...'
+
+def encode_file_token(file_url):
+    """Encode a Moodle file URL as a short URL-safe token for download/summarize links"""
+    if not file_url:
+        return ''
+    return base64.urlsafe_b64encode(file_url.encode()).rstrip(b'=').decode()
+
+def decode_file_token(token):
+    """Decode a token made by encode_file_token (None if it is empty or malformed)"""
+    try:
+        return base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)).decode() or None
+    except (binascii.Error, UnicodeDecodeError):
+        return None
+
+app.add_template_filter(nl2br, 'nl2br')
+app.add_template_filter(truncate_filter, 'truncate')
+app.add_template_filter(encode_file_token, 'file_token')
+
+# Moodle clients per token, so repeat requests from a user reuse the same client and connections
+CLIENT_CACHE_TTL = 1800
+_client_cache = TTLCache(maxsize=256, ttl=CLIENT_CACHE_TTL) if TTLCache is not None else None
+_client_cache_lock = threading.Lock()
+
+# Shared session for file downloads so keep-alive connections to Moodle are reused
+HTTP = requests.Session()
+HTTP.mount('https://', HTTPAdapter(pool_connections=32, pool_maxsize=64))
+
+# Background jobs (PDF summaries, grade analyses), so slow OpenAI calls don't hold a request thread.
+# Jobs are tracked in memory, so the status pages only work when the app runs as one process
+BACKGROUND_EXECUTOR = ThreadPoolExecutor(max_workers=4)
+_jobs = TTLCache(maxsize=1024, ttl=3600) if TTLCache is not None else {}
+# Job IDs of unfinished jobs by dedupe key, so a repeated submit joins the running job
+_running_jobs = {}
+_jobs_lock = threading.Lock()
+
+# Quoted filename in a Content-Disposition header
+_FILENAME_RE = re.compile(r'filename="([^"]+)"')
+
+# Drops percent signs from Moodle's formatted percentages and weights in a single pass
+_PERCENT_TABLE = str.maketrans('', '', '%')
+
+# Block size for copying downloaded files; large blocks keep the Python-level loop short
+DOWNLOAD_CHUNK_SIZE = 1 << 20
+
+# Course lists per token, so navigating within a course doesn't refetch them from Moodle
+COURSES_CACHE_TTL = 300
+_courses_cache = TTLCache(maxsize=1024, ttl=COURSES_CACHE_TTL) if TTLCache is not None else None
+_courses_cache_lock = threading.Lock()
+
+# What a failed Moodle call raises: API errors, connection/HTTP errors and malformed JSON
+MOODLE_ERRORS = (MoodleAPIError, requests.RequestException, ValueError)
+
+class MoodleError(HTTPException):
+    """Error rendered straight away as an error page instead of a flash and redirect"""
+    code = 400
+
+    def __init__(self, message, code=None):
+        super().__init__(message)
+        self.message = message
+        if code is not None:
+            self.code = code
+
+@app.errorhandler(MoodleError)
+def handle_moodle_error(error):
+    """Render a MoodleError with its status code"""
+    return render_template('error.html', message=error.message), error.code
+
+def require_course(view):
+    """
+    Decorator for routes under /course/<course_id>: requires a login and looks the course up once
+    
+    The course comes from the cached course list and is passed to the view as the course
+    keyword argument; a course the user isn't enrolled in is a 404.
+    """
+    @functools.wraps(view)
+    def wrapper(course_id, **kwargs):
+        if 'username' not in session:
+            flash('Please login first.', 'warning')
+            return redirect(url_for('login'))
+        
+        client = get_client()
+        if not client:
+            return redirect(url_for('login'))
+        
+        try:
+            course = _course_by_id(client, course_id)
+        except MOODLE_ERRORS as e:
+            raise MoodleError(f"Error retrieving course: {e}", 502)
+        
+        if not course:
+            raise MoodleError(f"Course with ID {course_id} not found.", 404)
+        
+        return view(course_id, course=course, **kwargs)
+    return wrapper
 
 class LoginForm(FlaskForm):
     """Form for logging in with Moodle API token"""
@@ -50,12 +256,14 @@ class LoginForm(FlaskForm):
 @app.route('/')
 def index():
     """Home page - AI Coach Hub"""
+    if 'username' not in session:
+        return cacheable(_anonymous_home())
     return render_template('home.html')
 
 @app.route('/home')
 def home():
     """Alias for home page"""
-    return render_template('home.html')
+    return index()
 
 @app.route('/login', methods=['GET', 'POST'])
 def login():
@@ -68,16 +276,19 @@ def login():
         
         try:
             # Try to connect to Moodle with the provided token
-            global moodle_client
-            moodle_client = MoodleAPIClient(token=token)
+            client = MoodleAPIClient(token=token)
             
             # Get user info
-            site_info = moodle_client.get_site_info()
+            site_info = client.get_site_info()
             username = site_info.get('fullname')
             
             # Store user info in session
             session['username'] = username
             session['token'] = token
+            g.moodle_client = client
+            if _client_cache is not None:
+                with _client_cache_lock:
+                    _client_cache[_token_key(token)] = client
             
             flash(f'Welcome, {username}!', 'success')
             return redirect(url_for('dashboard'))
@@ -89,6 +300,17 @@ def login():
 @app.route('/logout')
 def logout():
     """Logout and clear session"""
+    token = session.get('token')
+    if token:
+        key = _token_key(token)
+        if _courses_cache is not None:
+            with _courses_cache_lock:
+                _courses_cache.pop(key, None)
+        if _client_cache is not None:
+            with _client_cache_lock:
+                client = _client_cache.pop(key, None)
+            if client is not None:
+                client.close()
     session.clear()
     flash('You have been logged out.', 'info')
     return redirect(url_for('index'))
@@ -107,12 +329,12 @@ def dashboard():
     
     # Get courses
     try:
-        courses = client.get_courses()
+        courses, _ = get_courses_cached(client, session['token'])
     except Exception as e:
         flash(f"Error retrieving courses: {str(e)}", 'danger')
         courses = []
     
-    return render_template('dashboard_new.html', username=session['username'], courses=courses)
+    return cacheable(render_template('dashboard_new.html', username=session['username'], courses=courses))
 
 # ========== NEW FEATURE ROUTES ==========
 
@@ -137,7 +359,7 @@ def smart_study():
         return redirect(url_for('login'))
 
     try:
-        courses = client.get_courses()
+        courses, _ = get_courses_cached(client, session['token'])
     except Exception as e:
         flash(f"Error retrieving courses: {str(e)}", 'danger')
         courses = []
@@ -157,18 +379,22 @@ def live_sync():
         return redirect(url_for('login'))
 
     try:
-        courses = client.get_courses()
-        # Get all course contents
+        courses, _ = get_courses_cached(client, session['token'])
+        # Get all course contents concurrently; courses whose contents
+        # can't be fetched are left out
+        contents_by_id = client.get_many_course_contents(
+            [course['id'] for course in courses], return_exceptions=True
+        )
         all_contents = []
         for course in courses:
-            try:
-                contents = client.get_course_contents(course['id'])
-                all_contents.append({
-                    'course': course,
-                    'contents': contents
-                })
-            except:
-                pass
+            contents = contents_by_id[course['id']]
+            if isinstance(contents, Exception):
+                app.logger.warning(f"Error getting contents of course {course['id']}: {contents}")
+                continue
+            all_contents.append({
+                'course': course,
+                'contents': contents
+            })
     except Exception as e:
         flash(f"Error syncing with Moodle: {str(e)}", 'danger')
         all_contents = []
@@ -202,211 +428,164 @@ def brain_dump():
 # ========== END NEW FEATURE ROUTES ==========
 
 @app.route('/course/<int:course_id>')
-def course_detail(course_id):
+@require_course
+def course_detail(course_id, course):
     """Course detail page"""
-    if 'username' not in session:
-        flash('Please login first.', 'warning')
-        return redirect(url_for('login'))
-    
-    # Get client
-    client = get_client()
-    if not client:
-        return redirect(url_for('login'))
-    
-    # Get course info
-    try:
-        courses = client.get_courses()
-        course = next((c for c in courses if c['id'] == course_id), None)
-        
-        if not course:
-            flash(f"Course with ID {course_id} not found.", 'danger')
-            return redirect(url_for('dashboard'))
-    except Exception as e:
-        flash(f"Error retrieving course: {str(e)}", 'danger')
-        return redirect(url_for('dashboard'))
-    
-    return render_template('course_detail.html', course=course)
+    return cacheable(render_template('course_detail.html', course=course))
 
 @app.route('/course/<int:course_id>/grades')
-def course_grades(course_id):
+@require_course
+def course_grades(course_id, course):
     """Course grades page"""
-    if 'username' not in session:
-        flash('Please login first.', 'warning')
-        return redirect(url_for('login'))
-    
-    # Get client
     client = get_client()
-    if not client:
-        return redirect(url_for('login'))
     
-    # Get course info
+    # Get grades
     try:
-        courses = client.get_courses()
-        course = next((c for c in courses if c['id'] == course_id), None)
-        
-        if not course:
-            flash(f"Course with ID {course_id} not found.", 'danger')
-            return redirect(url_for('dashboard'))
-            
-        # Get grades
         grades = client.get_user_grades(course_id)
-        
     except Exception as e:
         flash(f"Error retrieving grades: {str(e)}", 'danger')
         grades = None
     
-    return render_template('course_grades.html', course=course, grades=grades)
+    if not grades or not grades.get('usergrades'):
+        return render_template('course_grades.html', course=course, has_grades=False)
+    
+    user_grades = grades['usergrades'][0]
+    
+    # Filter and clean the rows here so the template only has to print them
+    rows = [
+        {
+            'name': name,
+            'grade': (item.get('gradeformatted') or '-').replace('&nbsp;', ' ').strip(),
+            'weight': (item.get('weightformatted') or '-').replace('&nbsp;', ' ').strip(),
+            'feedback': (item.get('feedback') or '-').strip()
+        }
+        for item in user_grades.get('gradeitems') or ()
+        if (name := item.get('itemname')) and name.lower() != 'course total'
+    ]
+    
+    return render_template('course_grades.html', course=course, has_grades=True,
+                           overall_grade=user_grades.get('grade'), rows=rows,
+                           warnings=grades.get('warnings'))
 
 @app.route('/course/<int:course_id>/lecture_notes')
-def course_lecture_notes(course_id):
+@require_course
+def course_lecture_notes(course_id, course):
     """Course lecture notes page"""
-    if 'username' not in session:
-        flash('Please login first.', 'warning')
-        return redirect(url_for('login'))
-    
-    # Get client
     client = get_client()
-    if not client:
-        return redirect(url_for('login'))
     
-    # Get course info
+    # Get course contents
     try:
-        courses = client.get_courses()
-        course = next((c for c in courses if c['id'] == course_id), None)
-        
-        if not course:
-            flash(f"Course with ID {course_id} not found.", 'danger')
-            return redirect(url_for('dashboard'))
-            
-        # Get course contents
         contents = client.get_course_contents(course_id)
-        
-        # Extract lecture notes
-        lecture_notes = []
-        for section in contents:
-            section_name = section.get('name', f"Section {section.get('section', 0)}")
-            section_modules = []
-            
-            for module in section.get('modules', []):
-                if is_likely_lecture_note(module):
-                    module['section_name'] = section_name
-                    section_modules.append(module)
-            
-            if section_modules:
-                lecture_notes.append({
-                    'name': section_name,
-                    'modules': section_modules
-                })
-        
     except Exception as e:
         flash(f"Error retrieving lecture notes: {str(e)}", 'danger')
-        lecture_notes = []
+        return render_template('course_lecture_notes.html', course=course, lecture_notes=[])
+    
+    # The session is saved before a streamed body is rendered, so pop pending flashes
+    # now; base.html then reads them from the request context instead of the session
+    get_flashed_messages()
     
-    return render_template('course_lecture_notes.html', course=course, lecture_notes=lecture_notes)
+    # Stream the page so sections are sent as they are rendered
+    return Response(stream_template('course_lecture_notes.html', course=course,
+                                    lecture_notes=iter_lecture_note_sections(contents)))
 
-@app.route('/course/<int:course_id>/summarize/<int:module_id>/<path:file_url>')
-def summarize_pdf(course_id, module_id, file_url):
+@app.route('/course/<int:course_id>/summarize/<int:module_id>')
+@require_course
+def summarize_pdf(course_id, module_id, course):
     """Generate a summary for a PDF file"""
+    # The Moodle file URL arrives as an opaque base64 token in the query string
+    file_url = decode_file_token(request.args.get('file', ''))
+    if not file_url:
+        flash("No file specified.", 'warning')
+        return redirect(url_for('course_lecture_notes', course_id=course_id))
+    
+    # Summarize in the background and send the browser to the status page
+    job_id = submit_job(course, run_summary_job, course_id, module_id, file_url, session['token'])
+    return redirect(url_for('summary_status', job_id=job_id))
+
+@app.route('/summary/status/<job_id>')
+def summary_status(job_id):
+    """Show a pending page until a background summary is ready, then the summary"""
     if 'username' not in session:
         flash('Please login first.', 'warning')
         return redirect(url_for('login'))
     
-    # Get client
-    client = get_client()
-    if not client:
-        return redirect(url_for('login'))
-    
-    # Get course info
-    try:
-        courses = client.get_courses()
-        course = next((c for c in courses if c['id'] == course_id), None)
-        
-        if not course:
-            flash(f"Course with ID {course_id} not found.", 'danger')
-            return redirect(url_for('dashboard'))
-    except Exception as e:
-        flash(f"Error retrieving course: {str(e)}", 'danger')
+    job = get_job(job_id)
+    if job is None:
+        flash("Summary not found. It may have expired.", 'warning')
         return redirect(url_for('dashboard'))
     
-    # Clean up the file URL
-    file_url = file_url.replace('___', '?').replace('__', '&')
+    course = job['course']
+    future = job['future']
     
-    # Fix URL format if needed (ensure https:// has double slash)
-    if file_url.startswith('https:/') and not file_url.startswith('https://'):
-        file_url = file_url.replace('https:/', 'https://')
-    elif file_url.startswith('http:/') and not file_url.startswith('http://'):
-        file_url = file_url.replace('http:/', 'http://')
-        
-    # Fix URL encoding issues with percent signs
-    if '%25' in file_url:
-        file_url = file_url.replace('%25', '%')
+    if not future.done():
+        return pending_response(course, 'Summarizing PDF', 'The summary is being generated.')
     
     try:
-        # First download the file to a temporary location
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as temp_file:
-            temp_path = temp_file.name
-        
-        # Download the file
-        headers = {}
-        params = {
-            'token': session['token']
-        }
-        
-        response = requests.get(file_url, params=params, headers=headers, stream=True)
-        response.raise_for_status()
-        
-        with open(temp_path, 'wb') as f:
-            for chunk in response.iter_content(chunk_size=8192):
-                f.write(chunk)
-        
-        # Extract file name from Content-Disposition header or URL
-        filename = None
-        if 'Content-Disposition' in response.headers:
-            import re
-            disposition = response.headers['Content-Disposition']
-            filename = re.findall('filename="(.+)"', disposition)
-            if filename:
-                filename = filename[0]
-        
-        if not filename:
-            filename = os.path.basename(file_url.split('?')[0])
+        result = future.result()
+    except ValueError as e:
+        flash(str(e), 'warning')
+        return redirect(url_for('course_lecture_notes', course_id=course['id']))
+    except Exception as e:
+        flash(f"Error generating summary: {str(e)}", 'danger')
+        return redirect(url_for('course_lecture_notes', course_id=course['id']))
+    
+    return render_template('pdf_summary.html', course=course, **result)
+
+def run_summary_job(course_id, module_id, file_url, token):
+    """
+    Download a PDF from Moodle and summarize it (runs on BACKGROUND_EXECUTOR)
+    
+    Args:
+        course_id: ID of the course
+        module_id: ID of the module the file belongs to
+        file_url: Moodle file URL
+        token: Moodle API token of the user
         
-        # Check if file is a PDF
-        if not filename.lower().endswith('.pdf'):
-            flash("Only PDF files can be summarized.", 'warning')
-            os.unlink(temp_path)  # Delete temp file
-            return redirect(url_for('course_lecture_notes', course_id=course_id))
+    Returns:
+        Dict with filename, summary, file_url and generated_date for pdf_summary.html
         
-        # Initialize PDF summarizer
-        try:
-            pdf_summarizer = PDFSummarizer(api_key=config.OPENAI_API_KEY)
-        except Exception as e:
-            flash(f"Error initializing PDF summarizer: {str(e)}", 'danger')
-            os.unlink(temp_path)  # Delete temp file
-            return redirect(url_for('course_lecture_notes', course_id=course_id))
+    Raises:
+        ValueError: If the file is not a PDF
+    """
+    response = HTTP.get(file_url, params={'token': token}, stream=True)
+    response.raise_for_status()
+    
+    # Extract file name from Content-Disposition header or URL
+    filename = None
+    if 'Content-Disposition' in response.headers:
+        match = _FILENAME_RE.search(response.headers['Content-Disposition'])
+        filename = match.group(1) if match else None
+    
+    if not filename:
+        filename = os.path.basename(file_url.split('?')[0])
+    
+    # Check if file is a PDF before downloading the body
+    if not filename.lower().endswith('.pdf'):
+        response.close()
+        raise ValueError("Only PDF files can be summarized.")
+    
+    # Download to a temporary file that is removed when the block exits
+    with tempfile.NamedTemporaryFile(suffix='.pdf') as temp_file:
+        # Hash the file while writing it, so it isn't read back just to be hashed
+        response.raw.decode_content = True
+        hasher = hashlib.sha256()
+        for block in iter(lambda: response.raw.read(DOWNLOAD_CHUNK_SIZE), b''):
+            hasher.update(block)
+            temp_file.write(block)
+        temp_file.flush()
+        digest = hasher.hexdigest()
         
-        # Generate summary
-        try:
-            summary = pdf_summarizer.summarize_pdf(temp_path, course_id, module_id, filename)
-            
-            # Clean up temp file
-            os.unlink(temp_path)
-            
-            # Render summary page
-            return render_template('pdf_summary.html', 
-                                  course=course, 
-                                  filename=filename, 
-                                  summary=summary,
-                                  file_url=file_url,
-                                  generated_date=datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
-        except Exception as e:
-            flash(f"Error generating summary: {str(e)}", 'danger')
-            os.unlink(temp_path)  # Delete temp file
-            return redirect(url_for('course_lecture_notes', course_id=course_id))
+        # Generate and store the summary; summarize_pdf reuses the summary of identical
+        # content and still records it under this course and module
+        pdf_summarizer = _summarizer()
+        summary = pdf_summarizer.summarize_pdf(temp_file.name, course_id, module_id, filename, sha256=digest)
     
-    except Exception as e:
-        flash(f"Error downloading file: {str(e)}", 'danger')
-        return redirect(url_for('course_lecture_notes', course_id=course_id))
+    return {
+        'filename': filename,
+        'summary': summary,
+        'file_url': file_url,
+        'generated_date': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    }
 
 @app.route('/delete-summary/<int:summary_id>', methods=['POST'])
 def delete_summary(summary_id):
@@ -417,7 +596,7 @@ def delete_summary(summary_id):
     
     try:
         # Initialize PDF summarizer
-        pdf_summarizer = PDFSummarizer(api_key=config.OPENAI_API_KEY)
+        pdf_summarizer = _summarizer()
         
         # Get the summary to find its course ID for redirection
         summary = pdf_summarizer.get_summary_by_id(summary_id)
@@ -437,32 +616,12 @@ def delete_summary(summary_id):
         return redirect(url_for('dashboard'))
 
 @app.route('/course/<int:course_id>/summaries')
-def course_summaries(course_id):
+@require_course
+def course_summaries(course_id, course):
     """View all PDF summaries for a course"""
-    if 'username' not in session:
-        flash('Please login first.', 'warning')
-        return redirect(url_for('login'))
-    
-    # Get client
-    client = get_client()
-    if not client:
-        return redirect(url_for('login'))
-    
-    # Get course info
-    try:
-        courses = client.get_courses()
-        course = next((c for c in courses if c['id'] == course_id), None)
-        
-        if not course:
-            flash(f"Course with ID {course_id} not found.", 'danger')
-            return redirect(url_for('dashboard'))
-    except Exception as e:
-        flash(f"Error retrieving course: {str(e)}", 'danger')
-        return redirect(url_for('dashboard'))
-    
     # Get summaries
     try:
-        pdf_summarizer = PDFSummarizer(api_key=config.OPENAI_API_KEY)
+        pdf_summarizer = _summarizer()
         summaries = pdf_summarizer.get_all_summaries(course_id=course_id)
         
         return render_template('course_summaries.html', course=course, summaries=summaries)
@@ -470,8 +629,8 @@ def course_summaries(course_id):
         flash(f"Error retrieving summaries: {str(e)}", 'danger')
         return redirect(url_for('course_detail', course_id=course_id))
 
-@app.route('/course/<int:course_id>/download/<path:file_url>')
-def download_file(course_id, file_url):
+@app.route('/course/<int:course_id>/download')
+def download_file(course_id):
     """Download a file"""
     if 'username' not in session:
         flash('Please login first.', 'warning')
@@ -486,62 +645,260 @@ def download_file(course_id, file_url):
         # Get token
         token = session['token']
         
-        # Create a temporary file
-        with tempfile.NamedTemporaryFile(delete=False) as temp_file:
-            temp_path = temp_file.name
-        
-        # Download the file
-        file_url = file_url.replace('___', '?').replace('__', '&')
-        
-        # Fix URL format if needed (ensure https:// has double slash)
-        if file_url.startswith('https:/') and not file_url.startswith('https://'):
-            file_url = file_url.replace('https:/', 'https://')
-        elif file_url.startswith('http:/') and not file_url.startswith('http://'):
-            file_url = file_url.replace('http:/', 'http://')
-            
-        # Fix URL encoding issues with percent signs
-        if '%25' in file_url:
-            file_url = file_url.replace('%25', '%')
-        
-        # Add token to URL
-        if '?' in file_url:
-            full_url = f"{file_url}&token={token}"
-        else:
-            full_url = f"{file_url}?token={token}"
+        # The Moodle file URL arrives as an opaque base64 token in the query string
+        file_url = decode_file_token(request.args.get('file', ''))
+        if not file_url:
+            flash("No file specified.", 'warning')
+            return redirect(url_for('course_lecture_notes', course_id=course_id))
         
         # Get the filename from the URL
         filename = file_url.split('/')[-1].split('?')[0]
         
-        # Download the file
-        response = client._session.get(full_url, stream=True)
+        # Stream the file straight through to the browser instead of buffering it on disk
+        response = HTTP.get(file_url, params={'token': token}, stream=True)
         response.raise_for_status()
         
-        with open(temp_path, 'wb') as f:
-            for chunk in response.iter_content(chunk_size=8192):
-                f.write(chunk)
+        headers = {'Content-Disposition': f'attachment; filename="{filename}"', 'Vary': 'Accept-Encoding'}
+        
+        # Relay the body as sent (still compressed, if it was) so its length is known up front,
+        # but only when the browser accepts that encoding; otherwise decode it on the way through
+        encoding = response.headers.get('Content-Encoding')
+        passthrough = not encoding or request.accept_encodings[encoding] > 0
+        if passthrough:
+            for header in ('Content-Length', 'Content-Encoding'):
+                if header in response.headers:
+                    headers[header] = response.headers[header]
         
-        return send_file(temp_path, as_attachment=True, download_name=filename)
+        body = response.raw.stream(DOWNLOAD_CHUNK_SIZE, decode_content=not passthrough)
+        streamed = Response(stream_with_context(body),
+                            mimetype=response.headers.get('Content-Type', 'application/octet-stream'),
+                            headers=headers)
+        streamed.call_on_close(response.close)
+        return streamed
     
     except Exception as e:
         flash(f"Error downloading file: {str(e)}", 'danger')
         return redirect(url_for('course_lecture_notes', course_id=course_id))
 
+def cacheable(body):
+    """
+    Make a rendered page revalidatable by the user's browser
+    
+    The response gets an ETag of its body and 'private, no-cache', so the browser
+    asks again on every visit and gets an empty 304 when the page is unchanged.
+    The page depends on the session cookie (logged in or not, flashed messages),
+    so a copy is never reused without that check.
+    
+    Args:
+        body: Rendered page
+        
+    Returns:
+        Response object
+    """
+    response = make_response(body)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    response.add_etag()
+    return response.make_conditional(request)
+
+def submit_job(course, fn, *args, key=None):
+    """
+    Run a function on BACKGROUND_EXECUTOR on behalf of the current user
+    
+    Args:
+        course: Course the job belongs to, kept for the status page
+        fn: Function to run
+        *args: Arguments for fn
+        key: Optional dedupe key; while a job submitted by the same user with the
+             same key is still running, its ID is returned instead of a new job
+        
+    Returns:
+        Job ID for get_job
+    """
+    owner = _token_key(session['token'])
+    running_key = (owner, key) if key is not None else None
+    
+    with _jobs_lock:
+        if running_key is not None:
+            job_id = _running_jobs.get(running_key)
+            job = _jobs.get(job_id) if job_id else None
+            if job is not None and not job['future'].done():
+                return job_id
+        
+        job_id = secrets.token_urlsafe(16)
+        future = BACKGROUND_EXECUTOR.submit(fn, *args)
+        _jobs[job_id] = {
+            'future': future,
+            'owner': owner,
+            'course': course
+        }
+        if running_key is not None:
+            _running_jobs[running_key] = job_id
+    
+    if running_key is not None:
+        future.add_done_callback(lambda _: _forget_running_job(running_key, job_id))
+    return job_id
+
+def _forget_running_job(running_key, job_id):
+    """Drop a finished job from _running_jobs unless a newer job has taken its key"""
+    with _jobs_lock:
+        if _running_jobs.get(running_key) == job_id:
+            del _running_jobs[running_key]
+
+def get_job(job_id):
+    """The current user's job with this ID, or None if it is unknown, expired or someone else's"""
+    with _jobs_lock:
+        job = _jobs.get(job_id)
+    if job is None or job['owner'] != _token_key(session['token']):
+        return None
+    return job
+
+def pending_response(course, title, message):
+    """202 page that refreshes itself until a background job is done"""
+    response = make_response(render_template('pending.html', course=course, title=title, message=message), 202)
+    response.headers['Refresh'] = '3'
+    return response
+
+@functools.lru_cache(maxsize=1)
+def _anonymous_home():
+    """The home page as rendered for visitors who aren't logged in, which is the same for all of them"""
+    return render_template('home.html')
+
+@functools.lru_cache(maxsize=1)
+def _summarizer():
+    """Shared PDFSummarizer; its database connection is guarded by a lock, so threads can share it"""
+    return PDFSummarizer(api_key=config.OPENAI_API_KEY)
+
+@functools.lru_cache(maxsize=1)
+def _get_grade_analyzer():
+    """Shared GradeAnalyzer; its database connection is guarded by a lock, so threads can share it"""
+    return GradeAnalyzer(api_key=config.OPENAI_API_KEY)
+
+def _token_key(token):
+    """Cache key for a Moodle token, so raw tokens aren't kept as dict keys"""
+    return hashlib.sha256(token.encode()).hexdigest()
+
 def get_client():
-    """Get or create Moodle client"""
-    global moodle_client
+    """Get or create the Moodle client for the current user's token"""
+    client = getattr(g, 'moodle_client', None)
+    if client is not None:
+        return client
+    
+    if 'token' not in session:
+        return None
     
-    if moodle_client:
-        return moodle_client
+    key = _token_key(session['token'])
+    if _client_cache is not None:
+        with _client_cache_lock:
+            client = _client_cache.get(key)
     
-    if 'token' in session:
+    if client is None:
         try:
-            moodle_client = MoodleAPIClient(token=session['token'])
-            return moodle_client
+            client = MoodleAPIClient(token=session['token'])
         except Exception:
             flash('Session expired. Please login again.', 'warning')
             return None
+        if _client_cache is not None:
+            with _client_cache_lock:
+                _client_cache[key] = client
+    
+    g.moodle_client = client
+    return client
+
+def get_courses_cached(client, token):
+    """
+    Get the user's courses, cached per token for COURSES_CACHE_TTL seconds
+
+    Within a request the result is also kept on flask.g, so repeated lookups
+    skip the shared cache and its lock. Worker threads have no app context
+    and use the shared cache only.
+
+    Args:
+        client: MoodleAPIClient for the token
+        token: Moodle API token the courses belong to
+
+    Returns:
+        Tuple of (courses list, dict of courses keyed by course ID)
+    """
+    in_request = has_app_context()
+    if in_request and 'courses' in g:
+        return g.courses
+
+    cached = None
+    if _courses_cache is not None:
+        with _courses_cache_lock:
+            cached = _courses_cache.get(_token_key(token))
+
+    if cached is None:
+        # The client keeps its own course list for as long as it lives, so bypass it
+        # here; otherwise this TTL would never pick up new enrolments
+        courses = client.get_courses(refresh=True)
+        cached = (courses, {c['id']: c for c in courses})
+
+        if _courses_cache is not None:
+            with _courses_cache_lock:
+                _courses_cache[_token_key(token)] = cached
+
+    if in_request:
+        g.courses = cached
+    return cached
+
+def iter_lecture_note_sections(contents):
+    """
+    Yield the sections of a course that contain lecture notes, one at a time
     
-    return None
+    Args:
+        contents: Course contents (list of sections) from the Moodle API
+        
+    Yields:
+        Dicts with the section name and its lecture note modules; the modules are
+        copies, since the client may hand the same parsed contents to later calls
+    """
+    for section in contents:
+        section_name = section.get('name', f"Section {section.get('section', 0)}")
+        section_modules = [
+            {
+                **module,
+                'section_name': section_name,
+                'contents': [
+                    {**content, 'download_token': encode_file_token(content['fileurl'])}
+                    if 'fileurl' in content else content
+                    for content in module.get('contents', ())
+                ]
+            }
+            for module in section.get('modules', [])
+            if is_likely_lecture_note(module)
+        ]
+        
+        if section_modules:
+            yield {
+                'name': section_name,
+                'modules': section_modules
+            }
+
+# Module types shown on the lecture notes page
+_CONTENT_TYPES = frozenset({'resource', 'url', 'folder', 'page', 'book', 'label'})
+
+def _course_by_id(client, course_id):
+    """Look up one of the current user's courses by ID (None if not enrolled)"""
+    _, courses_by_id = get_courses_cached(client, session['token'])
+    return courses_by_id.get(course_id)
+
+def grade_items_digest(grade_items):
+    """
+    Fingerprint grade data, so identical grades map to the same stored analysis
+    
+    Args:
+        grade_items: List of grade item dicts
+        
+    Returns:
+        Hex digest of the grade items serialized with sorted keys
+    """
+    if orjson is not None:
+        data = orjson.dumps(grade_items, default=str,
+                            option=orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS)
+    else:
+        data = json.dumps(grade_items, sort_keys=True, default=str).encode()
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
 
 def is_likely_lecture_note(module):
     """
@@ -553,509 +910,138 @@ def is_likely_lecture_note(module):
     Returns:
         True if the module is course content (files, folders, URLs), False otherwise
     """
-    # Check module type
-    module_type = module.get('modname', '').lower()
-
     # Include all resources, folders, URLs, pages, and books
     # Exclude assignments, quizzes, forums, etc.
-    content_types = ['resource', 'url', 'folder', 'page', 'book', 'label']
-
-    return module_type in content_types
-
-def create_templates():
-    """Create HTML templates for the web app"""
-    templates_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'templates')
-    
-    # Base template
-    base_html = '''<!DOCTYPE html>
-<html lang="en">
-<head>
-    <meta charset="UTF-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>{% block title %}Moodle API Client{% endblock %}</title>
-    <link href="https://cdn.jsdelivr.net/npm/bootstrap@5.2.3/dist/css/bootstrap.min.css" rel="stylesheet">
-    <style>
-        body { padding-top: 60px; }
-        .course-card { height: 100%; }
-        .lecture-note { margin-bottom: 10px; }
-    </style>
-</head>
-<body>
-    <nav class="navbar navbar-expand-md navbar-dark bg-dark fixed-top">
-        <div class="container">
-            <a class="navbar-brand" href="{{ url_for('index') }}">Moodle API Client</a>
-            <button class="navbar-toggler" type="button" data-bs-toggle="collapse" data-bs-target="#navbarNav">
-                <span class="navbar-toggler-icon"></span>
-            </button>
-            <div class="collapse navbar-collapse" id="navbarNav">
-                <ul class="navbar-nav ms-auto">
-                    {% if 'username' in session %}
-                        <li class="nav-item">
-                            <a class="nav-link" href="{{ url_for('dashboard') }}">Dashboard</a>
-                        </li>
-                        <li class="nav-item">
-                            <a class="nav-link" href="{{ url_for('logout') }}">Logout</a>
-                        </li>
-                    {% else %}
-                        <li class="nav-item">
-                            <a class="nav-link" href="{{ url_for('login') }}">Login</a>
-                        </li>
-                    {% endif %}
-                </ul>
-            </div>
-        </div>
-    </nav>
-
-    <div class="container mt-4">
-        {% with messages = get_flashed_messages(with_categories=true) %}
-            {% if messages %}
-                {% for category, message in messages %}
-                    <div class="alert alert-{{ category }}">{{ message }}</div>
-                {% endfor %}
-            {% endif %}
-        {% endwith %}
-        
-        {% block content %}{% endblock %}
-    </div>
-
-    <script src="https://cdn.jsdelivr.net/npm/bootstrap@5.2.3/dist/js/bootstrap.bundle.min.js"></script>
-</body>
-</html>'''
-    
-    # Index template
-    index_html = '''{% extends "base.html" %}
-
-{% block title %}Moodle API Client - Home{% endblock %}
-
-{% block content %}
-<div class="px-4 py-5 my-5 text-center">
-    <h1 class="display-5 fw-bold">Moodle API Client</h1>
-    <div class="col-lg-6 mx-auto">
-        <p class="lead mb-4">
-            Access your Concordia University Moodle courses, grades, and lecture materials.
-        </p>
-        <div class="d-grid gap-2 d-sm-flex justify-content-sm-center">
-            <a href="{{ url_for('login') }}" class="btn btn-primary btn-lg px-4 gap-3">Login with API Token</a>
-        </div>
-    </div>
-</div>
-{% endblock %}'''
-    
-    # Login template
-    login_html = '''{% extends "base.html" %}
-
-{% block title %}Login - Moodle API Client{% endblock %}
-
-{% block content %}
-<div class="row justify-content-center">
-    <div class="col-md-6">
-        <div class="card">
-            <div class="card-header">
-                <h4 class="mb-0">Login with Moodle API Token</h4>
-            </div>
-            <div class="card-body">
-                {% if error %}
-                    <div class="alert alert-danger">{{ error }}</div>
-                {% endif %}
-                
-                <form method="POST" action="{{ url_for('login') }}">
-                    {{ form.hidden_tag() }}
-                    <div class="mb-3">
-                        {{ form.token.label(class="form-label") }}
-                        {{ form.token(class="form-control") }}
-                        <div class="form-text">
-                            You can obtain your token from Moodle. See the 
-                            <a href="https://github.com/yourusername/moodle-api-client/blob/main/docs/obtaining_api_token.md" target="_blank">documentation</a>.
-                        </div>
-                    </div>
-                    <div class="d-grid">
-                        {{ form.submit(class="btn btn-primary") }}
-                    </div>
-                </form>
-            </div>
-        </div>
-    </div>
-</div>
-{% endblock %}'''
-    
-    # Dashboard template
-    dashboard_html = '''{% extends "base.html" %}
-
-{% block title %}Dashboard - Moodle API Client{% endblock %}
-
-{% block content %}
-<h1 class="mb-4">Welcome, {{ username }}</h1>
-
-<h2 class="mb-3">Your Courses</h2>
-
-<div class="row row-cols-1 row-cols-md-3 g-4">
-    {% for course in courses %}
-        <div class="col">
-            <div class="card course-card">
-                <div class="card-body">
-                    <h5 class="card-title">{{ course.fullname }}</h5>
-                    <p class="card-text"><small class="text-muted">{{ course.shortname }}</small></p>
-                </div>
-                <div class="card-footer">
-                    <a href="{{ url_for('course_detail', course_id=course.id) }}" class="btn btn-primary">View Course</a>
-                </div>
-            </div>
-        </div>
-    {% else %}
-        <div class="col-12">
-            <div class="alert alert-info">You are not enrolled in any courses.</div>
-        </div>
-    {% endfor %}
-</div>
-{% endblock %}'''
-    
-    # Course detail template
-    course_detail_html = '''{% extends "base.html" %}
-
-{% block title %}{{ course.fullname }} - Moodle API Client{% endblock %}
-
-{% block content %}
-<nav aria-label="breadcrumb">
-    <ol class="breadcrumb">
-        <li class="breadcrumb-item"><a href="{{ url_for('dashboard') }}">Dashboard</a></li>
-        <li class="breadcrumb-item active">{{ course.fullname }}</li>
-    </ol>
-</nav>
-
-<h1 class="mb-4">{{ course.fullname }}</h1>
-<p><small class="text-muted">{{ course.shortname }}</small></p>
-
-<div class="row mt-4">
-    <div class="col-md-4 mb-3">
-        <div class="card">
-            <div class="card-body">
-                <h5 class="card-title">Grades</h5>
-                <p class="card-text">View your grades for this course.</p>
-                <a href="{{ url_for('course_grades', course_id=course.id) }}" class="btn btn-primary">View Grades</a>
-            </div>
-        </div>
-    </div>
-    
-    <div class="col-md-4 mb-3">
-        <div class="card">
-            <div class="card-body">
-                <h5 class="card-title">Lecture Notes</h5>
-                <p class="card-text">Access lecture notes and materials.</p>
-                <a href="{{ url_for('course_lecture_notes', course_id=course.id) }}" class="btn btn-primary">View Lecture Notes</a>
-            </div>
-        </div>
-    </div>
-</div>
-{% endblock %}'''
-    
-    # Course grades template
-    course_grades_html = '''{% extends "base.html" %}
-
-{% block title %}Grades: {{ course.fullname }} - Moodle API Client{% endblock %}
-
-{% block content %}
-<nav aria-label="breadcrumb">
-    <ol class="breadcrumb">
-        <li class="breadcrumb-item"><a href="{{ url_for('dashboard') }}">Dashboard</a></li>
-        <li class="breadcrumb-item"><a href="{{ url_for('course_detail', course_id=course.id) }}">{{ course.fullname }}</a></li>
-        <li class="breadcrumb-item active">Grades</li>
-    </ol>
-</nav>
-
-<h1 class="mb-4">Grades for {{ course.fullname }}</h1>
-
-{% if grades and 'usergrades' in grades and grades.usergrades %}
-    {% set user_grades = grades.usergrades[0] %}
-    
-    {% if 'grade' in user_grades %}
-        <div class="alert alert-info">
-            <h4>Overall Course Grade: {{ user_grades.grade }}</h4>
-        </div>
-    {% endif %}
-    
-    {% if 'gradeitems' in user_grades and user_grades.gradeitems %}
-        <div class="table-responsive">
-            <table class="table table-striped">
-                <thead>
-                    <tr>
-                        <th>Assessment</th>
-                        <th>Grade</th>
-                        <th>Weight</th>
-                        <th>Feedback</th>
-                    </tr>
-                </thead>
-                <tbody>
-                    {% for item in user_grades.gradeitems %}
-                        {% if item.itemname and item.itemname|lower != 'course total' %}
-                            <tr>
-                                <td>{{ item.itemname }}</td>
-                                <td>{{ item.gradeformatted|default('-') }}</td>
-                                <td>{{ item.weightformatted|default('-') }}</td>
-                                <td>{{ item.feedback|default('-') }}</td>
-                            </tr>
-                        {% endif %}
-                    {% endfor %}
-                </tbody>
-            </table>
-        </div>
-    {% else %}
-        <div class="alert alert-warning">No grade items found for this course.</div>
-    {% endif %}
-    
-    {% if 'warnings' in grades and grades.warnings %}
-        <div class="alert alert-warning">
-            <h5>Warnings:</h5>
-            <ul>
-                {% for warning in grades.warnings %}
-                    <li>{{ warning.message }}</li>
-                {% endfor %}
-            </ul>
-        </div>
-    {% endif %}
-{% else %}
-    <div class="alert alert-warning">
-        No grades available for this course. This could be because:
-        <ul>
-            <li>There are no graded items yet</li>
-            <li>The Moodle API doesn't have permission to access grades</li>
-            <li>There was an error retrieving the grades</li>
-        </ul>
-    </div>
-{% endif %}
-{% endblock %}'''
-    
-    # Course lecture notes template
-    course_lecture_notes_html = '''{% extends "base.html" %}
-
-{% block title %}Lecture Notes: {{ course.fullname }} - Moodle API Client{% endblock %}
-
-{% block content %}
-<nav aria-label="breadcrumb">
-    <ol class="breadcrumb">
-        <li class="breadcrumb-item"><a href="{{ url_for('dashboard') }}">Dashboard</a></li>
-        <li class="breadcrumb-item"><a href="{{ url_for('course_detail', course_id=course.id) }}">{{ course.fullname }}</a></li>
-        <li class="breadcrumb-item active">Lecture Notes</li>
-    </ol>
-</nav>
-
-<h1 class="mb-4">Lecture Notes for {{ course.fullname }}</h1>
-
-{% if lecture_notes %}
-    <div class="accordion" id="lectureNotesAccordion">
-        {% for section in lecture_notes %}
-            <div class="accordion-item">
-                <h2 class="accordion-header" id="heading{{ loop.index }}">
-                    <button class="accordion-button {% if not loop.first %}collapsed{% endif %}" type="button" data-bs-toggle="collapse" data-bs-target="#collapse{{ loop.index }}">
-                        {{ section.name }}
-                    </button>
-                </h2>
-                <div id="collapse{{ loop.index }}" class="accordion-collapse collapse {% if loop.first %}show{% endif %}" data-bs-parent="#lectureNotesAccordion">
-                    <div class="accordion-body">
-                        <div class="list-group">
-                            {% for module in section.modules %}
-                                <div class="list-group-item lecture-note">
-                                    <h5>{{ module.name }}</h5>
-                                    <p><small class="text-muted">Type: {{ module.modname }}</small></p>
-                                    
-                                    {% if 'contents' in module %}
-                                        <ul class="list-unstyled">
-                                            {% for content in module.contents %}
-                                                <li class="mb-2">
-                                                    <div class="d-flex justify-content-between align-items-center">
-                                                        <div>
-                                                            <i class="bi bi-file-earmark"></i>
-                                                            {{ content.filename }}
-                                                            <small class="text-muted">({{ (content.filesize / 1024)|round(1) }} KB)</small>
-                                                        </div>
-                                                        {% if 'fileurl' in content %}
-                                                            <a href="{{ url_for('download_file', course_id=course.id, file_url=content.fileurl|replace('?', '___')|replace('&', '__')) }}" 
-                                                               class="btn btn-sm btn-outline-primary">
-                                                                Download
-                                                            </a>
-                                                        {% endif %}
-                                                    </div>
-                                                </li>
-                                            {% endfor %}
-                                        </ul>
-                                    {% elif module.modname == 'url' and 'url' in module %}
-                                        <a href="{{ module.url }}" target="_blank" class="btn btn-sm btn-outline-primary">
-                                            Open URL
-                                        </a>
-                                    {% endif %}
-                                </div>
-                            {% endfor %}
-                        </div>
-                    </div>
-                </div>
-            </div>
-        {% endfor %}
-    </div>
-{% else %}
-    <div class="alert alert-info">No lecture notes found for this course.</div>
-{% endif %}
-{% endblock %}'''
-    
-    # Write templates to files
-    with open(os.path.join(templates_dir, 'base.html'), 'w') as f:
-        f.write(base_html)
-    
-    with open(os.path.join(templates_dir, 'index.html'), 'w') as f:
-        f.write(index_html)
-    
-    with open(os.path.join(templates_dir, 'login.html'), 'w') as f:
-        f.write(login_html)
-    
-    with open(os.path.join(templates_dir, 'dashboard.html'), 'w') as f:
-        f.write(dashboard_html)
-    
-    with open(os.path.join(templates_dir, 'course_detail.html'), 'w') as f:
-        f.write(course_detail_html)
-    
-    with open(os.path.join(templates_dir, 'course_grades.html'), 'w') as f:
-        f.write(course_grades_html)
-    
-    with open(os.path.join(templates_dir, 'course_lecture_notes.html'), 'w') as f:
-        f.write(course_lecture_notes_html)
-
-# Custom template filter for converting newlines to <br> tags
-@app.template_filter('nl2br')
-def nl2br(value):
-    if value:
-        return value.replace('\n', '<br>')
-    return ''
-
-# Custom template filter for truncating text
-@app.template_filter('truncate')
-def truncate_filter(s, length=100):
-    if not s:
-        return ''
-    if len(s) <= length:
-        return s
-    return s[:length] + '...'
+    return module.get('modname', '').lower() in _CONTENT_TYPES
 
 @app.route('/course/<int:course_id>/analyze-grades')
-def analyze_grades(course_id):
+@require_course
+def analyze_grades(course_id, course):
     """Generate an analysis for course grades"""
-    if 'username' not in session:
-        flash('Please login first.', 'warning')
-        return redirect(url_for('login'))
-    
-    # Get client
     client = get_client()
-    if not client:
-        return redirect(url_for('login'))
-    
-    # Get course info
-    try:
-        courses = client.get_courses()
-        course = next((c for c in courses if c['id'] == course_id), None)
-        
-        if not course:
-            flash(f"Course with ID {course_id} not found.", 'danger')
-            return redirect(url_for('dashboard'))
-    except Exception as e:
-        flash(f"Error retrieving course: {str(e)}", 'danger')
-        return redirect(url_for('dashboard'))
     
     # Get grades
     try:
         grades = client.get_user_grades(course_id)
-        
-        if not grades or 'usergrades' not in grades or not grades['usergrades']:
-            flash("No grades available for analysis.", 'warning')
-            return redirect(url_for('course_grades', course_id=course_id))
-        
-        user_grades = grades['usergrades'][0]
-        
-        if 'gradeitems' not in user_grades or not user_grades['gradeitems']:
-            flash("No grade items available for analysis.", 'warning')
-            return redirect(url_for('course_grades', course_id=course_id))
-        
-        # Format grade items for analysis
-        grade_items = []
-        for item in user_grades['gradeitems']:
-            if item['itemname'] and item['itemname'].lower() != 'course total':
-                grade_item = {
-                    'id': item.get('id'),
-                    'name': item.get('itemname'),
-                    'grade': item.get('gradeformatted', '').replace('&nbsp;', ' ').strip(),
-                    'percentage': item.get('percentageformatted', '').replace('%', '').strip(),
-                    'weight': item.get('weightformatted', '').replace('%', '').strip(),
-                    'feedback': item.get('feedback', '').strip(),
-                    'max_grade': item.get('grademax')
-                }
-                grade_items.append(grade_item)
-        
-        # Add course total if available
-        if 'grade' in user_grades:
-            grade_items.append({
-                'id': 'total',
-                'name': 'Course Total',
-                'grade': user_grades.get('grade', '').replace('&nbsp;', ' ').strip(),
-                'percentage': user_grades.get('percentage', ''),
-                'weight': '100',
-                'feedback': '',
-                'max_grade': 100
-            })
-        
-        # Generate analysis
-        try:
-            # Initialize grade analyzer
-            grade_analyzer = GradeAnalyzer(api_key=config.OPENAI_API_KEY)
-            
-            # Generate and store analysis
-            analysis = grade_analyzer.analyze_grades(course_id, grade_items)
-            
-            # Get the latest analysis (the one we just created)
-            analyses = grade_analyzer.get_all_analyses(course_id)
-            if analyses:
-                latest_analysis = analyses[0]
-                return redirect(url_for('view_analysis', analysis_id=latest_analysis['id']))
-            else:
-                flash("Error retrieving the generated analysis.", 'danger')
-                return redirect(url_for('course_grades', course_id=course_id))
-                
-        except Exception as e:
-            flash(f"Error generating analysis: {str(e)}", 'danger')
-            return redirect(url_for('course_grades', course_id=course_id))
-            
-    except Exception as e:
-        flash(f"Error retrieving grades: {str(e)}", 'danger')
+    except MOODLE_ERRORS as e:
+        flash(f"Error retrieving grades: {e}", 'danger')
         return redirect(url_for('course_grades', course_id=course_id))
-
-@app.route('/course/<int:course_id>/analyses')
-def course_analyses(course_id):
-    """View all grade analyses for a course"""
+    
+    if not grades or not grades.get('usergrades'):
+        flash("No grades available for analysis.", 'warning')
+        return redirect(url_for('course_grades', course_id=course_id))
+    
+    user_grades = grades['usergrades'][0]
+    
+    if not user_grades.get('gradeitems'):
+        flash("No grade items available for analysis.", 'warning')
+        return redirect(url_for('course_grades', course_id=course_id))
+    
+    # Format grade items for analysis
+    grade_items = [
+        {
+            'id': item.get('id'),
+            'name': name,
+            'grade': (item.get('gradeformatted') or '').replace('&nbsp;', ' ').strip(),
+            'percentage': (item.get('percentageformatted') or '').translate(_PERCENT_TABLE).strip(),
+            'weight': (item.get('weightformatted') or '').translate(_PERCENT_TABLE).strip(),
+            'feedback': (item.get('feedback') or '').strip(),
+            'max_grade': item.get('grademax')
+        }
+        for item in user_grades['gradeitems']
+        if (name := item.get('itemname')) and name.lower() != 'course total'
+    ]
+    
+    # Add course total if available
+    if 'grade' in user_grades:
+        grade_items.append({
+            'id': 'total',
+            'name': 'Course Total',
+            'grade': user_grades.get('grade', '').replace('&nbsp;', ' ').strip(),
+            'percentage': user_grades.get('percentage', ''),
+            'weight': '100',
+            'feedback': '',
+            'max_grade': 100
+        })
+    
+    # Initialize grade analyzer (fails without an OpenAI API key)
+    try:
+        grade_analyzer = _get_grade_analyzer()
+    except ValueError as e:
+        flash(f"Error generating analysis: {e}", 'danger')
+        return redirect(url_for('course_grades', course_id=course_id))
+    
+    # Reuse the analysis of identical grade data instead of asking OpenAI again
+    digest = grade_items_digest(grade_items)
+    existing = grade_analyzer.get_analysis_by_digest(course_id, digest)
+    if existing:
+        return redirect(url_for('view_analysis', analysis_id=existing['id']))
+    
+    # Generate and store the analysis in the background
+    job_id = submit_job(course, run_analysis_job, course_id, grade_items, digest,
+                        key=('analysis', course_id, digest))
+    return redirect(url_for('analysis_status', job_id=job_id))
+
+@app.route('/analysis/pending/<job_id>')
+def analysis_status(job_id):
+    """Show a pending page until a background analysis is ready, then redirect to it"""
     if 'username' not in session:
         flash('Please login first.', 'warning')
         return redirect(url_for('login'))
     
-    # Get client
-    client = get_client()
-    if not client:
-        return redirect(url_for('login'))
+    job = get_job(job_id)
+    if job is None:
+        flash("Analysis not found. It may have expired.", 'warning')
+        return redirect(url_for('dashboard'))
+    
+    course = job['course']
+    future = job['future']
+    
+    if not future.done():
+        return pending_response(course, 'Analyzing Grades', 'Your grade analysis is being generated.')
     
-    # Get course info
     try:
-        courses = client.get_courses()
-        course = next((c for c in courses if c['id'] == course_id), None)
-        
-        if not course:
-            flash(f"Course with ID {course_id} not found.", 'danger')
-            return redirect(url_for('dashboard'))
+        analysis_id = future.result()
     except Exception as e:
-        flash(f"Error retrieving course: {str(e)}", 'danger')
-        return redirect(url_for('dashboard'))
+        flash(f"Error generating analysis: {str(e)}", 'danger')
+        return redirect(url_for('course_grades', course_id=course['id']))
     
-    # Get analyses
-    try:
-        grade_analyzer = GradeAnalyzer(api_key=config.OPENAI_API_KEY)
-        analyses = grade_analyzer.get_all_analyses(course_id=course_id)
+    return redirect(url_for('view_analysis', analysis_id=analysis_id))
+
+def run_analysis_job(course_id, grade_items, digest):
+    """
+    Generate and store a grade analysis (runs on BACKGROUND_EXECUTOR)
+    
+    Args:
+        course_id: ID of the course
+        grade_items: Formatted grade items to analyze
+        digest: Digest of grade_items
         
-        return render_template('course_analyses.html', course=course, analyses=analyses)
-    except Exception as e:
-        flash(f"Error retrieving analyses: {str(e)}", 'danger')
+    Returns:
+        ID of the stored analysis
+    """
+    grade_analyzer = _get_grade_analyzer()
+    grade_analyzer.analyze_grades(course_id, grade_items, digest)
+    
+    # Get the analysis we just created
+    analysis = grade_analyzer.get_analysis_by_digest(course_id, digest)
+    if not analysis:
+        raise RuntimeError("Error retrieving the generated analysis.")
+    return analysis['id']
+
+@app.route('/course/<int:course_id>/analyses')
+@require_course
+def course_analyses(course_id, course):
+    """View all grade analyses for a course"""
+    try:
+        grade_analyzer = _get_grade_analyzer()
+    except ValueError as e:
+        flash(f"Error retrieving analyses: {e}", 'danger')
         return redirect(url_for('course_detail', course_id=course_id))
+    
+    # Get analyses
+    analyses = grade_analyzer.get_all_analyses(course_id=course_id)
+    return render_template('course_analyses.html', course=course, analyses=analyses)
 
 @app.route('/analysis/<int:analysis_id>')
 def view_analysis(analysis_id):
@@ -1070,28 +1056,27 @@ def view_analysis(analysis_id):
         return redirect(url_for('login'))
     
     try:
-        # Initialize grade analyzer
-        grade_analyzer = GradeAnalyzer(api_key=config.OPENAI_API_KEY)
-        
-        # Get the analysis
-        analysis = grade_analyzer.get_analysis(analysis_id)
-        if not analysis:
-            flash("Analysis not found.", 'danger')
-            return redirect(url_for('dashboard'))
-        
-        # Get course info
-        course_id = analysis['course_id']
-        courses = client.get_courses()
-        course = next((c for c in courses if c['id'] == course_id), None)
-        
-        if not course:
-            flash(f"Course with ID {course_id} not found.", 'danger')
-            return redirect(url_for('dashboard'))
-        
-        return render_template('grade_analysis.html', course=course, analysis=analysis)
-    except Exception as e:
-        flash(f"Error retrieving analysis: {str(e)}", 'danger')
+        grade_analyzer = _get_grade_analyzer()
+    except ValueError as e:
+        flash(f"Error retrieving analysis: {e}", 'danger')
         return redirect(url_for('dashboard'))
+    
+    # Get the analysis
+    analysis = grade_analyzer.get_analysis(analysis_id)
+    if not analysis:
+        raise MoodleError("Analysis not found.", 404)
+    
+    # Get course info
+    course_id = analysis['course_id']
+    try:
+        course = _course_by_id(client, course_id)
+    except MOODLE_ERRORS as e:
+        raise MoodleError(f"Error retrieving course: {e}", 502)
+    
+    if not course:
+        raise MoodleError(f"Course with ID {course_id} not found.", 404)
+    
+    return render_template('grade_analysis.html', course=course, analysis=analysis)
 
 @app.route('/delete-analysis/<int:analysis_id>', methods=['POST'])
 def delete_analysis(analysis_id):
@@ -1101,33 +1086,32 @@ def delete_analysis(analysis_id):
         return redirect(url_for('login'))
     
     try:
-        # Initialize grade analyzer
-        grade_analyzer = GradeAnalyzer(api_key=config.OPENAI_API_KEY)
-        
-        # Get the analysis to find its course ID for redirection
-        analysis = grade_analyzer.get_analysis(analysis_id)
-        if not analysis:
-            flash("Analysis not found.", 'danger')
-            return redirect(url_for('dashboard'))
-        
-        course_id = analysis['course_id']
-        
-        # Delete the analysis
-        grade_analyzer.delete_analysis(analysis_id)
-        
-        flash("Analysis deleted successfully.", 'success')
-        return redirect(url_for('course_analyses', course_id=course_id))
-    except Exception as e:
-        flash(f"Error deleting analysis: {str(e)}", 'danger')
+        grade_analyzer = _get_grade_analyzer()
+    except ValueError as e:
+        flash(f"Error deleting analysis: {e}", 'danger')
         return redirect(url_for('dashboard'))
+    
+    # Get the analysis to find its course ID for redirection
+    analysis = grade_analyzer.get_analysis(analysis_id)
+    if not analysis:
+        raise MoodleError("Analysis not found.", 404)
+    
+    course_id = analysis['course_id']
+    
+    # Delete the analysis
+    if grade_analyzer.delete_analysis(analysis_id):
+        flash("Analysis deleted successfully.", 'success')
+    else:
+        flash("Error deleting analysis.", 'danger')
+    return redirect(url_for('course_analyses', course_id=course_id))
 
-if __name__ == '__main__':
-    # Create templates directory if it doesn't exist
-    templates_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'templates')
-    os.makedirs(templates_dir, exist_ok=True)
+def preload_templates():
+    """Compile every template up front so the first request doesn't pay for parsing"""
+    for template_name in app.jinja_env.list_templates(extensions=['html']):
+        app.jinja_env.get_template(template_name)
 
-    # Create template files if they don't exist
-    create_templates()
+preload_templates()
 
-    # Run the app
-    app.run(debug=True, port=5001)
+if __name__ == '__main__':
+    # Run the app; each request gets its own thread so slow Moodle calls don't block others
+    app.run(debug=True, port=5001, threaded=True)